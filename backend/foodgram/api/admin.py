@@ -0,0 +1,48 @@
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from . import profiling
+
+
+def superuser_view(view):
+    """Профили содержат детали выполнения кода, поэтому страницы
+    доступны только суперпользователям."""
+
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return view(request, *args, **kwargs)
+
+    return admin.site.admin_view(wrapper)
+
+
+def profile_list(request):
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'profiles': profiling.list_profiles(),
+        'header': 'X-Profile',
+        'token': profiling.make_token(request.user),
+    }
+    return TemplateResponse(request, 'admin/profiles.html', context)
+
+
+def profile_download(request, name):
+    path = profiling.get_profile_path(name)
+
+    if path is None:
+        raise Http404
+
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+
+
+profiling_urls = [
+    path('', superuser_view(profile_list), name='admin-profiles'),
+    path(
+        '<str:name>/', superuser_view(profile_download),
+        name='admin-profile-download'
+    ),
+]
@@ -0,0 +1,140 @@
+from array import array
+from typing import Dict, FrozenSet, Iterable, List
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from foodgram.db_routers import PRIMARY
+from recipes import models
+from users.models import Subscription
+
+# Версия в ключе: прежние представления с абсолютным адресом
+# изображения не читаются.
+RECIPE_KEY = 'recipe:v2:{}'
+USER_IDS_KEY = 'user:{}:{}'
+
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+FOLLOWING = 'following'
+
+# Источник множества id для каждого вида связи пользователя:
+# модель, поле пользователя и поле с id связанного объекта.
+USER_IDS_SOURCES = {
+    FAVORITES: (models.Favorites, 'user_id', 'recipe_id'),
+    SHOPPING_CART: (models.ShoppingCart, 'user_id', 'recipe_id'),
+    FOLLOWING: (Subscription, 'user_id', 'following_id'),
+}
+
+
+def get_recipe_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def recipe_cache_key(pk: int) -> str:
+    return RECIPE_KEY.format(pk)
+
+
+def get_recipe_bodies(pks: Iterable[int]) -> Dict[int, dict]:
+    """Возвращает закэшированные представления рецептов одним запросом."""
+
+    keys = {recipe_cache_key(pk): pk for pk in pks}
+    cached = get_recipe_cache().get_many(keys.keys())
+    return {keys[key]: body for key, body in cached.items()}
+
+
+def set_recipe_bodies(bodies: Dict[int, dict]) -> None:
+    get_recipe_cache().set_many(
+        {recipe_cache_key(pk): body for pk, body in bodies.items()},
+        timeout=settings.RECIPE_CACHE_TIMEOUT
+    )
+
+
+def invalidate_recipes(pks: Iterable[int]) -> None:
+    """Сбрасывает кэш рецептов после фиксации текущей транзакции."""
+
+    keys = [recipe_cache_key(pk) for pk in pks]
+
+    if keys:
+        transaction.on_commit(lambda: get_recipe_cache().delete_many(keys))
+
+
+def apply_user_flags(
+    bodies: List[dict], favorited, in_shopping_cart, following,
+    build_absolute_uri
+) -> List[dict]:
+    """Дополняет общие представления рецептов флагами пользователя
+    и абсолютным адресом изображения для текущего запроса.
+    Флаги, исключенные из представления, не добавляются."""
+
+    result = [None] * len(bodies)
+
+    for num, body in enumerate(bodies):
+        body = dict(body)
+
+        if 'author' in body:
+            body['author'] = dict(body['author'])
+            body['author']['is_subscribed'] = (
+                body['author']['id'] in following
+            )
+        if 'is_favorited' in body:
+            body['is_favorited'] = body['id'] in favorited
+        if 'is_in_shopping_cart' in body:
+            body['is_in_shopping_cart'] = body['id'] in in_shopping_cart
+        if body.get('image'):
+            body['image'] = build_absolute_uri(body['image'])
+
+        result[num] = body
+
+    return result
+
+
+def get_relations_cache():
+    return caches[settings.RELATIONS_CACHE_ALIAS]
+
+
+def _pack_ids(ids: Iterable[int]) -> bytes:
+    return array('q', sorted(ids)).tobytes()
+
+
+def _unpack_ids(raw: bytes) -> FrozenSet[int]:
+    ids = array('q')
+    ids.frombytes(raw)
+    return frozenset(ids)
+
+
+def get_user_ids_queryset(user_id: int, kind: str):
+    model, user_field, id_field = USER_IDS_SOURCES[kind]
+    return model.objects.filter(
+        **{user_field: user_id}
+    ).values_list(id_field, flat=True)
+
+
+def get_user_ids(user_id: int, kind: str) -> FrozenSet[int]:
+    """Возвращает множество id избранных рецептов, рецептов в списке
+    покупок или авторов в подписках пользователя.
+    Множество хранится в кэше в виде упакованного массива целых чисел
+    и загружается из базы при отсутствии."""
+
+    key = USER_IDS_KEY.format(user_id, kind)
+    relations_cache = get_relations_cache()
+    raw = relations_cache.get(key)
+
+    if raw is None:
+        # Кэш заполняется с основной базы: отстающая реплика
+        # закэшировала бы устаревшее множество.
+        raw = _pack_ids(get_user_ids_queryset(user_id, kind).using(PRIMARY))
+        relations_cache.set(
+            key, raw, timeout=settings.RELATIONS_CACHE_TIMEOUT
+        )
+
+    return _unpack_ids(raw)
+
+
+def invalidate_user_ids(user_id: int, kind: str) -> None:
+    """Сбрасывает закэшированное множество id после фиксации текущей
+    транзакции: следующее чтение загрузит его из базы. Множество не
+    дополняется на месте: одновременные изменения перезаписали бы
+    друг друга."""
+
+    key = USER_IDS_KEY.format(user_id, kind)
+    transaction.on_commit(lambda: get_relations_cache().delete(key))
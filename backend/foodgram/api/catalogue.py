@@ -0,0 +1,375 @@
+"""Потоковая выгрузка и загрузка каталога в формате NDJSON.
+
+Каждая строка - объект с ключом type. Записи выгружаются в порядке
+зависимостей: теги, ингредиенты, пользователи, рецепты с тегами,
+ингредиентами и именем файла изображения, подписки, избранное и списки
+покупок. Таблицы читаются серверными курсорами, теги и ингредиенты
+рецептов присоединяются слиянием потоков, упорядоченных по id рецепта.
+
+При загрузке записи вставляются пачками через bulk_create, id из файла
+заменяются на id в базе. Существующие теги, ингредиенты, пользователи
+и рецепты (по названию и хэшу описания) сопоставляются по уникальным
+полям и не дублируются.
+Файлы изображений переносятся отдельно, вместе с каталогом media.
+"""
+import json
+from contextlib import contextmanager
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            RecipeScore, RecipeTag, ShoppingCart, Tag,
+                            get_text_digest)
+from users.models import Subscription, User
+
+from . import cache
+from .suggestions import invalidate_ingredient_index
+
+USER_FIELDS = [
+    'id', 'username', 'email', 'first_name', 'last_name', 'password',
+    'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+]
+
+
+class RelatedRows:
+    """Строки (recipe_id, ...), упорядоченные по recipe_id, выдаваемые
+    по возрастанию id рецепта."""
+
+    def __init__(self, rows):
+        self.groups = groupby(rows, key=itemgetter(0))
+        self.current = next(self.groups, None)
+
+    def pop(self, recipe_id):
+        while self.current is not None and self.current[0] < recipe_id:
+            self.current = next(self.groups, None)
+
+        if self.current is None or self.current[0] != recipe_id:
+            return []
+
+        # Группа читается один раз: следующий вызов перейдет дальше.
+        return [list(row[1:]) for row in self.current[1]]
+
+
+def dump_recipes(chunk_size):
+    tags = RelatedRows(RecipeTag.objects.filter(
+        tag__isnull=False
+    ).order_by('recipe_id').values_list(
+        'recipe_id', 'tag_id'
+    ).iterator(chunk_size=chunk_size))
+    ingredients = RelatedRows(RecipeIngredient.objects.order_by(
+        'recipe_id'
+    ).values_list(
+        'recipe_id', 'ingredient_id', 'amount'
+    ).iterator(chunk_size=chunk_size))
+
+    for recipe in Recipe.objects.order_by('pk').values(
+        'id', 'author', 'name', 'text', 'image', 'cooking_time', 'pub_date'
+    ).iterator(chunk_size=chunk_size):
+        recipe['tags'] = [tag for tag, in tags.pop(recipe['id'])]
+        recipe['ingredients'] = ingredients.pop(recipe['id'])
+        yield recipe
+
+
+def dump_records(chunk_size):
+    """Записи каталога в порядке зависимостей."""
+
+    sources = [
+        ('tag', Tag.objects.values('id', 'name', 'color', 'slug')),
+        ('ingredient', Ingredient.objects.values(
+            'id', 'name', 'measurement_unit'
+        )),
+        ('user', User.objects.values(*USER_FIELDS)),
+        ('recipe', None),
+        ('subscription', Subscription.objects.values(
+            'user', 'following', 'sub_date'
+        )),
+        ('favorite', Favorites.objects.values('user', 'recipe', 'added_at')),
+        ('shopping_cart', ShoppingCart.objects.values(
+            'user', 'recipe', 'servings', 'added_at'
+        )),
+    ]
+
+    for record_type, queryset in sources:
+        if queryset is None:
+            rows = dump_recipes(chunk_size)
+        else:
+            rows = queryset.order_by('pk').iterator(chunk_size=chunk_size)
+
+        for row in rows:
+            row['type'] = record_type
+            yield row
+
+
+def dump_catalogue(stream, chunk_size):
+    """Выгружает каталог в текстовый поток. Возвращает число записей."""
+
+    count = 0
+
+    for count, record in enumerate(dump_records(chunk_size), start=1):
+        stream.write(
+            json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False)
+        )
+        stream.write('\n')
+
+    return count
+
+
+@contextmanager
+def keep_auto_now_add(*models):
+    """Отключает auto_now_add, чтобы bulk_create сохранил даты из файла."""
+
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+
+    for field in fields:
+        field.auto_now_add = False
+
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def read_batches(lines, batch_size):
+    """Пачки не более batch_size подряд идущих записей одного типа."""
+
+    records = (json.loads(line) for line in lines if line.strip())
+
+    for record_type, group in groupby(records, key=itemgetter('type')):
+        while True:
+            batch = list(islice(group, batch_size))
+            if not batch:
+                break
+            yield record_type, batch
+
+
+class CatalogueRestorer:
+    """Загружает пачки записей, запоминая соответствие id из файла
+    и id в базе."""
+
+    def __init__(self):
+        self.ids = {'tag': {}, 'ingredient': {}, 'user': {}, 'recipe': {}}
+        self.counts = {}
+
+    def restore(self, record_type, records):
+        handler = getattr(self, f'restore_{record_type}', None)
+
+        if handler is None:
+            raise ValueError(f'Unknown record type: {record_type}')
+
+        with transaction.atomic():
+            created = handler(records)
+
+        self.counts[record_type] = self.counts.get(record_type, 0) + created
+
+    def create(self, record_type, model, records, existing, key, build):
+        """Сопоставляет записи с существующими объектами по ключу key(record)
+        в словаре existing, недостающие создает из build(record).
+        Возвращает id созданных записей из файла."""
+
+        ids = self.ids[record_type]
+        pending = []
+
+        for record in records:
+            if key(record) in existing:
+                ids[record['id']] = existing[key(record)]
+            else:
+                pending.append((record['id'], build(record)))
+
+        model.objects.bulk_create([instance for _, instance in pending])
+
+        for old_id, instance in pending:
+            ids[old_id] = instance.pk
+
+        return [old_id for old_id, _ in pending]
+
+    def restore_tag(self, records):
+        existing = dict(Tag.objects.filter(
+            slug__in=[record['slug'] for record in records]
+        ).values_list('slug', 'pk'))
+
+        return len(self.create(
+            'tag', Tag, records, existing, itemgetter('slug'),
+            lambda record: Tag(
+                name=record['name'], color=record['color'],
+                slug=record['slug']
+            )
+        ))
+
+    def restore_ingredient(self, records):
+        existing = {
+            (name, unit): pk for pk, name, unit in Ingredient.objects.filter(
+                name__in=[record['name'] for record in records]
+            ).values_list('pk', 'name', 'measurement_unit')
+        }
+
+        created = self.create(
+            'ingredient', Ingredient, records, existing,
+            itemgetter('name', 'measurement_unit'),
+            lambda record: Ingredient(
+                name=record['name'],
+                measurement_unit=record['measurement_unit']
+            )
+        )
+        # bulk_create не отправляет сигналы.
+        invalidate_ingredient_index()
+
+        return len(created)
+
+    def restore_user(self, records):
+        # Пользователь совпадает с существующим по username или email.
+        existing = {}
+
+        for pk, username, email in User.objects.filter(
+            Q(username__in=[record['username'] for record in records])
+            | Q(email__in=[record['email'] for record in records])
+        ).values_list('pk', 'username', 'email'):
+            existing[username] = pk
+            existing[email] = pk
+
+        def key(record):
+            if record['username'] in existing:
+                return record['username']
+            return record['email']
+
+        return len(self.create(
+            'user', User, records, existing, key,
+            lambda record: User(**{
+                field: record[field] for field in USER_FIELDS
+                if field != 'id'
+            })
+        ))
+
+    def restore_recipe(self, records):
+        authors = self.ids['user']
+        records = [record for record in records if record['author'] in authors]
+        existing = dict(
+            ((name, digest), pk) for pk, name, digest in Recipe.objects.filter(
+                name__in=[record['name'] for record in records]
+            ).values_list('pk', 'name', 'text_digest')
+        )
+        created = set(self.create(
+            'recipe', Recipe, records, existing,
+            lambda record: (record['name'], get_text_digest(record['text'])),
+            # bulk_create не вызывает save, хэш описания задается явно.
+            lambda record: Recipe(
+                author_id=authors[record['author']],
+                name=record['name'], text=record['text'],
+                text_digest=get_text_digest(record['text']),
+                image=record['image'],
+                cooking_time=record['cooking_time'],
+                pub_date=record['pub_date']
+            )
+        ))
+
+        tags = self.ids['tag']
+        ingredients = self.ids['ingredient']
+        recipe_tags = []
+        recipe_ingredients = []
+
+        # Связи добавляются только новым рецептам.
+        for record in records:
+            if record['id'] not in created:
+                continue
+
+            recipe_id = self.ids['recipe'][record['id']]
+
+            recipe_tags.extend(
+                RecipeTag(recipe_id=recipe_id, tag_id=tags[tag])
+                for tag in record['tags'] if tag in tags
+            )
+            recipe_ingredients.extend(
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredients[ingredient], amount=amount
+                )
+                for ingredient, amount in record['ingredients']
+                if ingredient in ingredients
+            )
+
+        RecipeTag.objects.bulk_create(recipe_tags)
+        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        # bulk_create не отправляет сигналы, строки популярности
+        # новых рецептов создаются явно.
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe_id=self.ids['recipe'][pk]) for pk in created],
+            ignore_conflicts=True
+        )
+
+        return len(created)
+
+    def create_relations(self, model, kind, field, target, records, build):
+        """Добавляет связи пользователей, пропуская уже существующие,
+        и сбрасывает закэшированные множества id.
+        field - поле записи со ссылкой на объект типа target."""
+
+        users = self.ids['user']
+        targets = self.ids[target]
+        user_ids = set()
+        instances = []
+
+        for record in records:
+            if record['user'] not in users or record[field] not in targets:
+                continue
+
+            user_id = users[record['user']]
+            target_id = targets[record[field]]
+            instances.append(build(record, user_id, target_id))
+            user_ids.add(user_id)
+
+        # bulk_create не отправляет сигналы, кэш сбрасывается явно.
+        model.objects.bulk_create(instances, ignore_conflicts=True)
+
+        for user_id in user_ids:
+            cache.invalidate_user_ids(user_id, kind)
+
+        return len(instances)
+
+    def restore_subscription(self, records):
+        return self.create_relations(
+            Subscription, cache.FOLLOWING, 'following', 'user', records,
+            lambda record, user_id, following_id: Subscription(
+                user_id=user_id, following_id=following_id,
+                sub_date=record['sub_date']
+            )
+        )
+
+    def restore_favorite(self, records):
+        return self.create_relations(
+            Favorites, cache.FAVORITES, 'recipe', 'recipe', records,
+            lambda record, user_id, recipe_id: Favorites(
+                user_id=user_id, recipe_id=recipe_id,
+                added_at=record['added_at']
+            )
+        )
+
+    def restore_shopping_cart(self, records):
+        return self.create_relations(
+            ShoppingCart, cache.SHOPPING_CART, 'recipe', 'recipe', records,
+            lambda record, user_id, recipe_id: ShoppingCart(
+                user_id=user_id, recipe_id=recipe_id,
+                servings=record['servings'], added_at=record['added_at']
+            )
+        )
+
+
+def restore_catalogue(lines, batch_size):
+    """Загружает каталог из строк NDJSON. Возвращает по типам записей
+    число созданных объектов, для связей - число переданных в базу
+    записей, включая уже существовавшие."""
+
+    restorer = CatalogueRestorer()
+
+    with keep_auto_now_add(
+        User, Recipe, Subscription, Favorites, ShoppingCart
+    ):
+        for record_type, records in read_batches(lines, batch_size):
+            restorer.restore(record_type, records)
+
+    return restorer.counts
@@ -1,11 +1,20 @@
 import django_filters.rest_framework as filters
+from django.db.models import Case, F, IntegerField, When
 from recipes import models
 
+from .suggestions import get_ingredient_index
+
+SCORE_ORDERING = {
+    'popular': 'score__popularity',
+    'trending': 'score__trending',
+}
+
 
 class RecipeFilter(filters.FilterSet):
     """Фильр для вьюсета рецептов.
     Реализована фильтрация по id автора, тегам рецепта,
-    нахождению рецепта в избранном или списке покупок.
+    нахождению рецепта в избранном или списке покупок
+    и сортировка по популярности (ordering=popular или trending).
     """
 
     tags = filters.ModelMultipleChoiceFilter(
@@ -21,6 +30,10 @@ class RecipeFilter(filters.FilterSet):
         field_name='is_in_shopping_cart',
         method='filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=[(value, value) for value in SCORE_ORDERING],
+        method='filter_ordering'
+    )
 
     def filter_is_favorited(self, queryset, name, value):
         return queryset.filter(favorites_related__user=self.request.user)
@@ -28,6 +41,15 @@ class RecipeFilter(filters.FilterSet):
     def filter_is_in_shopping_cart(self, queryset, name, value):
         return queryset.filter(shoppingcart_related__user=self.request.user)
 
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по предрассчитанной популярности рецепта.
+        Строка популярности есть у каждого рецепта, условие на нее
+        дает INNER JOIN, и порядок читается по индексу популярности."""
+
+        return queryset.filter(score__isnull=False).order_by(
+            F(SCORE_ORDERING[value]).desc(), '-pub_date'
+        )
+
     class Meta:
         model = models.Recipe
         fields = ['author']
@@ -35,13 +57,22 @@ class RecipeFilter(filters.FilterSet):
 
 class IngredientSearchFilter(filters.FilterSet):
     """Фильр для вьюсета ингредиентов.
-    Реализована фильтрация по точному вхождению в начало названия.
+    Реализован поиск по началу названия с исправлением раскладки
+    и опечаток, см. api.suggestions.
     """
 
     name = filters.CharFilter(
-        field_name="name", lookup_expr='istartswith'
+        field_name="name", method='filter_name'
     )
 
+    def filter_name(self, queryset, name, value):
+        ids = get_ingredient_index().search(value)
+
+        return queryset.filter(pk__in=ids).order_by(Case(
+            *[When(pk=pk, then=num) for num, pk in enumerate(ids)],
+            output_field=IntegerField()
+        ))
+
     class Meta:
         model = models.Ingredient
         fields = ('name',)
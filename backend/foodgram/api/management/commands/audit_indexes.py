@@ -0,0 +1,177 @@
+import json
+
+from api.cache import USER_IDS_SOURCES, get_user_ids_queryset
+from api.filters import SCORE_ORDERING
+from api.views import FoodgramUserViewSet, RecipeViewSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from recipes.models import Tag
+from users.models import User
+
+PLAN_NODE_SEQ_SCAN = 'Seq Scan'
+PLAN_NODE_SORT = 'Sort'
+
+
+class Command(BaseCommand):
+    help = (
+        'runs EXPLAIN (ANALYZE, BUFFERS) for the hot API queries '
+        'and reports sequential scans and sorts on large tables'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int,
+            help='id of the user whose feed, favorites and cart are audited'
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=10000,
+            help='tables and sorts with fewer rows are not reported'
+        )
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='print full plans in addition to the findings'
+        )
+
+    def build_view(self, viewset, action, user, params=None):
+        """Вьюсет, обрабатывающий GET-запрос пользователя user
+        с параметрами params."""
+
+        view = viewset(
+            action_map={'get': action}, args=(), kwargs={}, format_kwarg=None
+        )
+        request = view.initialize_request(
+            RequestFactory().get('/', params or {})
+        )
+        request.user = user
+        view.request = request
+        return view
+
+    def get_page_size(self, view):
+        return view.paginator.get_page_size(view.request)
+
+    def get_catalogue(self, user):
+        """Запросы API, построенные вьюсетами и фильтрами, которые
+        обслуживают запросы пользователя user: первая страница списков
+        и множества id для флагов в представлениях рецептов."""
+
+        recipe_lists = [
+            ('recipe list', {}),
+            ('recipe list by author', {'author': user.pk}),
+            ('recipe list by favorites', {'is_favorited': 1}),
+            ('recipe list by shopping cart', {'is_in_shopping_cart': 1}),
+        ]
+        recipe_lists.extend(
+            (f'recipe list by {ordering}', {'ordering': ordering})
+            for ordering in SCORE_ORDERING
+        )
+        tag = Tag.objects.values_list('slug', flat=True).first()
+
+        if tag is not None:
+            recipe_lists.append(('recipe list by tag', {'tags': tag}))
+
+        catalogue = []
+
+        for name, params in recipe_lists:
+            view = self.build_view(RecipeViewSet, 'list', user, params)
+            catalogue.append((
+                name,
+                view.get_list_queryset().values_list(
+                    'pk', flat=True
+                )[:self.get_page_size(view)]
+            ))
+
+        view = self.build_view(FoodgramUserViewSet, 'subscriptions', user)
+        catalogue.append((
+            'subscriptions',
+            view.get_subscriptions_queryset()[:self.get_page_size(view)]
+        ))
+
+        for kind in USER_IDS_SOURCES:
+            catalogue.append(
+                (f'{kind} ids', get_user_ids_queryset(user.pk, kind))
+            )
+
+        return catalogue
+
+    def get_table_sizes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"
+            )
+            return dict(cursor.fetchall())
+
+    def walk_plan(self, node):
+        yield node
+        for child in node.get('Plans', ()):
+            yield from self.walk_plan(child)
+
+    def get_findings(self, plan, table_sizes, min_rows):
+        findings = []
+
+        for node in self.walk_plan(plan['Plan']):
+            node_type = node['Node Type']
+
+            if node_type == PLAN_NODE_SEQ_SCAN:
+                table = node['Relation Name']
+                if table_sizes.get(table, 0) >= min_rows:
+                    findings.append(
+                        f'sequential scan on {table} '
+                        f'(~{int(table_sizes[table])} rows)'
+                    )
+
+            elif node_type == PLAN_NODE_SORT:
+                rows = node.get('Actual Rows', node['Plan Rows'])
+                if rows >= min_rows:
+                    findings.append(
+                        f'sort of {rows} rows by {", ".join(node["Sort Key"])}'
+                    )
+
+        return findings
+
+    def get_user(self, user_id):
+        users = User.objects.order_by('pk')
+
+        if user_id is not None:
+            users = users.filter(pk=user_id)
+
+        user = users.first()
+
+        if user is None:
+            raise CommandError('No user to audit the queries with')
+
+        return user
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'EXPLAIN (ANALYZE, BUFFERS) requires PostgreSQL, '
+                f'current database is {connection.vendor}'
+            )
+
+        user = self.get_user(kwargs['user'])
+        table_sizes = self.get_table_sizes()
+        issues = 0
+
+        for name, queryset in self.get_catalogue(user):
+            plan = json.loads(
+                queryset.explain(format='json', analyze=True, buffers=True)
+            )[0]
+            findings = self.get_findings(
+                plan, table_sizes, kwargs['min_rows']
+            )
+
+            summary = f'{name}: {plan["Execution Time"]:.2f} ms'
+
+            if findings:
+                issues += len(findings)
+                self.stdout.write(self.style.WARNING(summary))
+                for finding in findings:
+                    self.stdout.write(self.style.WARNING(f'  - {finding}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(summary))
+
+            if kwargs['plans']:
+                self.stdout.write(json.dumps(plan, indent=2))
+
+        self.stdout.write(f'{issues} issues found')
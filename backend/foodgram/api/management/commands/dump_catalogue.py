@@ -0,0 +1,40 @@
+import gzip
+import sys
+
+from api.catalogue import dump_catalogue
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'streams tags, ingredients, users, recipes, subscriptions, '
+        'favorites and shopping carts as NDJSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', type=str, nargs='?', default='-',
+            help='output file, gzip-compressed for .gz, stdout for -'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.CATALOGUE_CHUNK_SIZE,
+            help='rows fetched from the database cursor at a time'
+        )
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path']
+
+        if path == '-':
+            dump_catalogue(sys.stdout, kwargs['chunk_size'])
+            return
+
+        if path.endswith('.gz'):
+            stream = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            stream = open(path, 'w', encoding='utf-8')
+
+        with stream:
+            count = dump_catalogue(stream, kwargs['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'{count} records dumped'))
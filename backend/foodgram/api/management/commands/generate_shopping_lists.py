@@ -0,0 +1,43 @@
+import os
+
+from api.shopping_lists import generate_shopping_lists
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+def get_current_week():
+    year, week, _ = timezone.localdate().isocalendar()
+    return f'{year}-W{week:02d}'
+
+
+class Command(BaseCommand):
+    help = (
+        'renders shopping list PDFs for every user with a non-empty cart '
+        'into media storage across a process pool'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--label', type=str, default=get_current_week(),
+            help='subdirectory of SHOPPING_LISTS_DIR, the ISO week by default'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='rendering processes'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.SHOPPING_LIST_BATCH_SIZE,
+            help='users aggregated per query and sent to a worker at a time'
+        )
+
+    def handle(self, *args, **kwargs):
+        stats = generate_shopping_lists(
+            kwargs['label'], kwargs['workers'], kwargs['batch_size']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats.users} shopping lists ({stats.size / 2 ** 20:.1f} MiB) '
+            f'in {stats.elapsed:.1f} s: {stats.throughput:.1f} lists/s'
+        ))
@@ -0,0 +1,106 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в отдельном интерпретаторе с -X importtime: время импорта
+# и первого запроса измеряются в холодном процессе, как у нового воркера.
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from foodgram.wsgi import application
+loaded = time.perf_counter()
+if {warm}:
+    from foodgram.warmup import warm_up, warm_up_worker
+    warm_up()
+    warm_up_worker()
+warmed = time.perf_counter()
+from django.conf import settings
+from django.test import Client
+host = next(
+    (h.lstrip('.') for h in settings.ALLOWED_HOSTS if h and '*' not in h),
+    'localhost'
+)
+status = Client(HTTP_HOST=host).get({path!r}).status_code
+done = time.perf_counter()
+print(json.dumps({{
+    'load': loaded - start, 'warm_up': warmed - loaded,
+    'first_request': done - warmed, 'status': status,
+}}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'measures import time by top-level package and time to the first '
+        'request in a fresh interpreter, with and without warm-up'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', type=str, default='/api/recipes/',
+            help='path of the first request'
+        )
+        parser.add_argument(
+            '--top', type=int, default=15,
+            help='number of top-level packages to report'
+        )
+
+    def run_probe(self, path, warm):
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+        result = subprocess.run(
+            [
+                sys.executable, '-X', 'importtime', '-c',
+                PROBE.format(warm=warm, path=path)
+            ],
+            cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True
+        )
+
+        if result.returncode:
+            errors = [
+                line for line in result.stderr.splitlines()
+                if not line.startswith('import time:')
+            ]
+            raise CommandError(errors[-1])
+
+        return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+    def get_import_times(self, importtime_log):
+        """Собственное время импорта модулей в микросекундах,
+        просуммированное по пакетам верхнего уровня."""
+
+        times = defaultdict(int)
+
+        for line in importtime_log.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+
+            self_time, _, name = line[len('import time:'):].split('|')
+            times[name.strip().split('.')[0]] += int(self_time)
+
+        return sorted(times.items(), key=lambda item: -item[1])
+
+    def handle(self, *args, **kwargs):
+        cold, importtime_log = self.run_probe(kwargs['path'], warm=False)
+        warm, _ = self.run_probe(kwargs['path'], warm=True)
+
+        self.stdout.write('import time by package:')
+        for name, usec in self.get_import_times(importtime_log)[
+            :kwargs['top']
+        ]:
+            self.stdout.write(f'  {name:<30} {usec / 1000:8.1f} ms')
+
+        for title, timings in (('cold', cold), ('warmed', warm)):
+            self.stdout.write(
+                f'{title}: load {timings["load"] * 1000:.1f} ms, '
+                f'warm-up {timings["warm_up"] * 1000:.1f} ms, '
+                f'first request {timings["first_request"] * 1000:.1f} ms '
+                f'(status {timings["status"]})'
+            )
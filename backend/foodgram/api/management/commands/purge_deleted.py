@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from foodgram.soft_delete import purge_deleted
+
+
+class Command(BaseCommand):
+    help = (
+        'deletes soft-deleted users and recipes with their related rows '
+        'in bounded batches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='exit after one pass instead of polling'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PURGE_BATCH_SIZE,
+            help='related rows deleted per transaction'
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            objects, rows = purge_deleted(kwargs['batch_size'])
+
+            if objects or kwargs['once']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{objects} objects purged, {rows} rows deleted'
+                ))
+
+            if kwargs['once']:
+                break
+
+            time.sleep(settings.PURGE_POLL_INTERVAL)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from foodgram.db_routers import get_replicas, measure_replica_lag
+
+
+class Command(BaseCommand):
+    help = 'prints replication lag of the read replicas in seconds'
+
+    def handle(self, *args, **kwargs):
+        replicas = get_replicas()
+
+        if not replicas:
+            self.stdout.write('No read replicas configured')
+
+        for alias in replicas:
+            lag = measure_replica_lag(alias)
+
+            if lag is None:
+                self.stdout.write(self.style.ERROR(f'{alias}: unavailable'))
+            else:
+                self.stdout.write(f'{alias}: {lag:.3f} s')
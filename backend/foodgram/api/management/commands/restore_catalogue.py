@@ -0,0 +1,48 @@
+import gzip
+import sys
+
+from api.catalogue import restore_catalogue
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'loads an NDJSON catalogue made by dump_catalogue, '
+        'remapping ids and skipping objects that already exist'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', type=str,
+            help='input file, gzip-compressed for .gz, stdin for -'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.CATALOGUE_CHUNK_SIZE,
+            help='records inserted by one bulk_create'
+        )
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path']
+
+        opener = gzip.open if path.endswith('.gz') else open
+
+        try:
+            stream = sys.stdin if path == '-' else opener(
+                path, 'rt', encoding='utf-8'
+            )
+        except FileNotFoundError:
+            raise CommandError(f'File {path} does not exist')
+
+        try:
+            counts = restore_catalogue(stream, kwargs['batch_size'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for record_type, count in counts.items():
+            self.stdout.write(
+                self.style.SUCCESS(f'{count} {record_type} records loaded')
+            )
@@ -0,0 +1,207 @@
+import cProfile
+import hashlib
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.urls import reverse
+from foodgram.db_routers import use_replica
+from rest_framework.permissions import SAFE_METHODS
+
+from .nplusone import report, track_queries
+from .profiling import check_token, save_profile
+
+WRITE_SLOT_KEY = 'write_slot:{}'
+PRIMARY_PIN_KEY = 'primary_pin:{}'
+
+
+def is_read_request(request):
+    """Читающий запрос: безопасный метод или пакетный API, вложенные
+    запросы которого только GET."""
+
+    return request.method in SAFE_METHODS or request.path == reverse('batch')
+
+
+class WriteConcurrencyLimitMiddleware:
+    """Ограничивает число одновременно выполняемых изменяющих запросов к API,
+    чтобы всплеск записей не занимал все соединения с базой данных.
+    Сверх WRITE_CONCURRENCY_LIMIT отвечает 503 с заголовком Retry-After,
+    читающие запросы не ограничиваются.
+
+    Вместо общего счетчика запрос занимает один из
+    WRITE_CONCURRENCY_LIMIT слотов - ключей кэша THROTTLE_CACHE_ALIAS,
+    добавляемых атомарно (cache.add) со сроком
+    WRITE_CONCURRENCY_KEY_TIMEOUT. Слот упавшего процесса или
+    потерянный кэшем освобождается сам, и лимит не смещается, как
+    счетчик с пропущенным уменьшением. С общим бэкендом кэша (Redis,
+    Memcached) лимит глобальный, с локальным - на процесс."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def acquire(self):
+        """Занимает свободный слот. Возвращает ключ и метку слота
+        или None, если свободных нет."""
+
+        keys = [
+            WRITE_SLOT_KEY.format(num)
+            for num in range(settings.WRITE_CONCURRENCY_LIMIT)
+        ]
+        taken = self.cache.get_many(keys)
+        token = uuid.uuid4().hex
+
+        for key in keys:
+            if key not in taken and self.cache.add(
+                key, token, timeout=settings.WRITE_CONCURRENCY_KEY_TIMEOUT
+            ):
+                return key, token
+
+        return None
+
+    def release(self, slot):
+        key, token = slot
+
+        # Слот, истекший во время запроса, мог занять другой запрос.
+        if self.cache.get(key) == token:
+            self.cache.delete(key)
+
+    def __call__(self, request):
+        if (
+            not request.path.startswith('/api/')
+            or is_read_request(request)
+        ):
+            return self.get_response(request)
+
+        slot = self.acquire()
+
+        if slot is None:
+            response = JsonResponse(
+                {'detail': 'Сервис перегружен, повторите запрос позже.'},
+                status=503
+            )
+            response['Retry-After'] = str(settings.WRITE_RETRY_AFTER)
+            return response
+
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(slot)
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтение с реплик для читающих запросов к API.
+    После изменяющего запроса клиент на REPLICA_STICKY_SECONDS секунд
+    закрепляется за основной базой, чтобы сразу видеть свои изменения.
+    Клиент определяется по заголовку Authorization и по IP: запись
+    закрепляет оба ключа, чтение проверяет оба. Поэтому запросы
+    с токеном, полученным при входе или после регистрации без токена,
+    тоже видят эти изменения."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+    def get_pin_keys(self, request):
+        clients = [request.META.get('REMOTE_ADDR', '')]
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+
+        if authorization:
+            clients.append(authorization)
+
+        return [
+            PRIMARY_PIN_KEY.format(hashlib.sha256(client.encode()).hexdigest())
+            for client in clients
+        ]
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        pin_keys = self.get_pin_keys(request)
+
+        if not is_read_request(request):
+            try:
+                return self.get_response(request)
+            finally:
+                self.cache.set_many(
+                    dict.fromkeys(pin_keys, True),
+                    timeout=settings.REPLICA_STICKY_SECONDS
+                )
+
+        if self.cache.get_many(pin_keys):
+            return self.get_response(request)
+
+        token = use_replica.set(True)
+
+        try:
+            return self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+
+class ProfilingMiddleware:
+    """Профилирует cProfile долю PROFILING_SAMPLE_RATE запросов
+    и запросы с подписанным заголовком X-Profile, значение которого
+    выдается на странице профилей в админке. Профили сохраняются
+    в кольцевой буфер api.profiling с именем представления.
+    Профилируется только поток запроса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        token = request.META.get(settings.PROFILING_HEADER)
+
+        if token is not None:
+            return check_token(token)
+
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        match = request.resolver_match
+        save_profile(
+            profiler, match.view_name if match else None, request.method,
+            response.status_code, time.perf_counter() - started
+        )
+        return response
+
+
+class NPlusOneMiddleware:
+    """Ищет N+1 запросы к базе в запросах к API (api.nplusone):
+    предупреждает или выбрасывает исключение в зависимости
+    от N_PLUS_ONE_DETECTION. Для разработки и тестов."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.N_PLUS_ONE_DETECTION
+
+        if mode == 'off' or not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        with track_queries() as tracker:
+            response = self.get_response(request)
+
+        report(
+            tracker.get_problems(), mode,
+            f'{request.method} {request.get_full_path()} '
+            f'({response.status_code})'
+        )
+        return response
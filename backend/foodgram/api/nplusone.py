@@ -0,0 +1,187 @@
+"""Поиск N+1 запросов к базе данных.
+
+Во время запроса к API все запросы к базе группируются по форме (SQL
+без значений параметров, списки IN любой длины совпадают). Форма,
+повторенная N_PLUS_ONE_THRESHOLD раз и больше, считается N+1, где бы
+ни выполнялись запросы: во вьюсете, фильтре, пермишене или
+сериализаторе. В сообщении указываются поля сериализаторов, при
+вычислении которых выполнялись запросы, и лениво загружаемые связи
+(obj.author без select_related). Вложенные запросы пакетного API
+отслеживаются каждый отдельно (track_subrequest).
+
+Режим задается N_PLUS_ONE_DETECTION: 'warn' выдает NPlusOneWarning,
+'raise' выбрасывает NPlusOneError, 'off' отключает поиск.
+"""
+import contextvars
+import re
+import sys
+import warnings
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor, ReverseOneToOneDescriptor)
+from rest_framework.serializers import Serializer
+
+IN_LIST = re.compile(r'\((?:%s, )*%s\)')
+
+SERIALIZER_FIELD_CODE = Serializer.to_representation.__code__
+FORWARD_LOAD_CODE = ForwardManyToOneDescriptor.get_object.__code__
+REVERSE_LOAD_CODE = ReverseOneToOneDescriptor.__get__.__code__
+
+
+# Трекер, которому засчитываются запросы текущего контекста.
+current_tracker = contextvars.ContextVar('query_tracker', default=None)
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+class NPlusOneWarning(RuntimeWarning):
+    pass
+
+
+def get_query_shape(sql: str) -> str:
+    return IN_LIST.sub('(...)', sql)
+
+
+def get_query_source(frame):
+    """Поле сериализатора, при вычислении которого выполняется запрос,
+    и связь, загружаемая лениво, по стеку вызовов. Берется ближайшее
+    поле: для вложенных сериализаторов - поле вложенного."""
+
+    field = relation = None
+
+    while frame is not None and field is None:
+        code = frame.f_code
+        if code is SERIALIZER_FIELD_CODE and 'field' in frame.f_locals:
+            field = '{}.{}'.format(
+                type(frame.f_locals['self']).__name__,
+                frame.f_locals['field'].field_name
+            )
+        elif code is FORWARD_LOAD_CODE and relation is None:
+            model_field = frame.f_locals['self'].field
+            relation = f'{model_field.model.__name__}.{model_field.name}'
+        elif code is REVERSE_LOAD_CODE and relation is None:
+            related = frame.f_locals['self'].related
+            relation = (
+                f'{related.model.__name__}.{related.get_accessor_name()}'
+            )
+        frame = frame.f_back
+
+    return field, relation
+
+
+class QueryTracker:
+    """Обертка выполнения запросов (connection.execute_wrapper),
+    группирующая запросы по форме."""
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.fields = defaultdict(set)
+        self.relations = defaultdict(set)
+        self.nested_problems = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # Запросы вложенного трекера внешнему не засчитываются.
+        if current_tracker.get() is self:
+            shape = get_query_shape(sql)
+            field, relation = get_query_source(sys._getframe(1))
+            self.counts[shape] += 1
+            if field is not None:
+                self.fields[shape].add(field)
+            if relation is not None:
+                self.relations[shape].add(relation)
+
+        return execute(sql, params, many, context)
+
+    def get_problems(self) -> List[str]:
+        problems = []
+
+        for shape, count in self.counts.items():
+            if count < self.threshold:
+                continue
+            details = ''
+            if self.fields[shape]:
+                details += ' в {}'.format(
+                    ', '.join(sorted(self.fields[shape]))
+                )
+            if self.relations[shape]:
+                details += ' (ленивая загрузка {})'.format(
+                    ', '.join(sorted(self.relations[shape]))
+                )
+            problems.append(f'{count} одинаковых запросов{details}: {shape}')
+
+        return problems + self.nested_problems
+
+
+def report(problems: List[str], mode: str, context: str) -> None:
+    if not problems:
+        return
+
+    message = 'N+1 в {}:\n{}'.format(context, '\n'.join(problems))
+
+    if mode == 'raise':
+        raise NPlusOneError(message)
+
+    warnings.warn(message, NPlusOneWarning, stacklevel=3)
+
+
+@contextmanager
+def track_queries(threshold: Optional[int] = None):
+    """Отслеживает запросы всех подключений к базе в текущем потоке."""
+
+    tracker = QueryTracker(threshold or settings.N_PLUS_ONE_THRESHOLD)
+    token = current_tracker.set(tracker)
+
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(tracker))
+            yield tracker
+    finally:
+        current_tracker.reset(token)
+
+
+@contextmanager
+def track_subrequest(context: str):
+    """Отслеживает вложенный запрос пакетного API отдельно: одинаковые
+    запросы разных вложенных запросов не N+1. Найденное передается
+    трекеру пакета. Без трекера пакета ничего не делает."""
+
+    tracker = current_tracker.get()
+
+    if tracker is None:
+        yield
+        return
+
+    with track_queries(tracker.threshold) as nested:
+        yield
+
+    # Список собирается заранее: extend готового списка атомарен для
+    # параллельных вложенных запросов.
+    problems = [f'{context}: {problem}' for problem in nested.get_problems()]
+    tracker.nested_problems.extend(problems)
+
+
+class NPlusOneTestMixin:
+    """Примесь к django.test.TestCase: N+1 в запросах тестового клиента
+    к API выбрасывают NPlusOneError, тест падает. assert_no_n_plus_one
+    проверяет код, выполняемый вне запросов."""
+
+    def setUp(self):
+        super().setUp()
+        override = self.settings(N_PLUS_ONE_DETECTION='raise')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    @contextmanager
+    def assert_no_n_plus_one(self, threshold=None):
+        with track_queries(threshold) as tracker:
+            yield tracker
+        report(tracker.get_problems(), 'raise', 'проверяемом коде')
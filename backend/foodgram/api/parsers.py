@@ -0,0 +1,90 @@
+"""Загрузка изображения рецепта в multipart/form-data.
+
+Поля рецепта передаются JSON-объектом в части data, изображение -
+файлом в части image. Файл пишется во временный файл по мере чтения
+тела запроса, в памяти остается только текущий фрагмент; загрузка
+больше RECIPE_IMAGE_MAX_SIZE прерывается, не дочитывая файл.
+"""
+import json
+
+from django.conf import settings
+from django.core.files.uploadhandler import (StopUpload,
+                                             TemporaryFileUploadHandler)
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+IMAGE_TOO_LARGE = 'Размер изображения больше {max_size:g} МБ.'
+
+
+def get_image_too_large_error():
+    return ValidationError({'image': [IMAGE_TOO_LARGE.format(
+        max_size=settings.RECIPE_IMAGE_MAX_SIZE / 2 ** 20
+    )]})
+
+
+class ParsedData(dict):
+    """Поля из части data. Request.data объединяет их с файлами через
+    copy() и update(); dict.update скопировал бы из MultiValueDict
+    списки значений, здесь берется последнее значение, как в QueryDict.
+    Файлы остаются в MultiValueDict, чтобы Django закрыл и удалил
+    временные файлы в конце запроса."""
+
+    def copy(self):
+        return ParsedData(self)
+
+    def update(self, other=(), **kwargs):
+        if isinstance(other, MultiValueDict):
+            other = other.dict()
+        super().update(other, **kwargs)
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Сохраняет файлы во временные файлы, останавливая загрузку файла
+    больше max_size."""
+
+    def __init__(self, max_size, request=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.exceeded = True
+            # Остаток тела не дочитывается, соединение закрывается.
+            raise StopUpload(connection_reset=True)
+
+        return super().receive_data_chunk(raw_data, start)
+
+
+class MultiPartJSONParser(MultiPartParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+
+        # Тело с заведомо большим файлом отклоняется до чтения.
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+
+        if content_length > max_size + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise get_image_too_large_error()
+
+        handler = LimitedUploadHandler(max_size)
+        request.upload_handlers = [handler]
+        result = super().parse(stream, media_type, parser_context)
+
+        if handler.exceeded:
+            raise get_image_too_large_error()
+
+        try:
+            data = json.loads(result.data.get('data') or '{}')
+        except ValueError as error:
+            raise ParseError(f'Часть data должна содержать JSON: {error}')
+
+        if not isinstance(data, dict):
+            raise ParseError('Часть data должна содержать JSON-объект.')
+
+        return DataAndFiles(ParsedData(data), result.files)
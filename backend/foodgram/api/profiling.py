@@ -0,0 +1,133 @@
+"""Хранение профилей запросов в кольцевом буфере на диске.
+
+Профиль - файл pstats (cProfile), открывается pstats, snakeviz и т.п.
+Имя файла содержит время, имя представления, метод, статус ответа
+и длительность запроса. После записи в каталоге PROFILING_DIR
+остаются только PROFILING_MAX_FILES последних профилей.
+"""
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'api.profiling'
+
+PROFILE_NAME = re.compile(
+    r'^(?P<timestamp>\d+)_(?P<view>[\w.:-]+)_(?P<method>[A-Z]+)_'
+    r'(?P<status>\d{3})_(?P<duration>\d+)ms_[0-9a-f]{8}\.prof$'
+)
+
+
+@dataclass
+class Profile:
+    name: str
+    created: datetime
+    view: str
+    method: str
+    status: int
+    duration: int
+    size: int
+
+
+def get_profiles_dir() -> Path:
+    return Path(settings.PROFILING_DIR)
+
+
+def make_token(user) -> str:
+    """Значение заголовка, включающего профилирование запроса."""
+
+    return signing.dumps(user.pk, salt=TOKEN_SALT)
+
+
+def check_token(token: str) -> bool:
+    try:
+        signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+
+    return True
+
+
+def save_profile(profiler, view, method, status, duration) -> str:
+    directory = get_profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    view = re.sub(r'[^\w.:-]', '-', view or 'unresolved')
+    name = (
+        f'{time.time_ns() // 1000}_{view}_{method}_{status}_'
+        f'{int(duration * 1000)}ms_{uuid.uuid4().hex[:8]}.prof'
+    )
+    # Запись через временный файл: в списке не бывает недописанных
+    # профилей.
+    temporary = directory / f'.{name}.tmp'
+    profiler.dump_stats(temporary)
+    os.replace(temporary, directory / name)
+
+    trim_profiles()
+    return name
+
+
+def trim_profiles() -> None:
+    names = sorted(
+        entry.name for entry in os.scandir(get_profiles_dir())
+        if PROFILE_NAME.match(entry.name)
+    )
+
+    for name in names[:-settings.PROFILING_MAX_FILES]:
+        try:
+            os.unlink(get_profiles_dir() / name)
+        except FileNotFoundError:
+            # Файл уже удален другим процессом.
+            pass
+
+
+def list_profiles() -> List[Profile]:
+    """Профили от новых к старым."""
+
+    directory = get_profiles_dir()
+
+    if not directory.is_dir():
+        return []
+
+    profiles = []
+
+    for entry in os.scandir(directory):
+        match = PROFILE_NAME.match(entry.name)
+        if match is None:
+            continue
+        try:
+            size = entry.stat().st_size
+        except FileNotFoundError:
+            continue
+        profiles.append(Profile(
+            name=entry.name,
+            created=datetime.fromtimestamp(
+                int(match['timestamp']) / 1_000_000, tz=timezone.utc
+            ),
+            view=match['view'],
+            method=match['method'],
+            status=int(match['status']),
+            duration=int(match['duration']),
+            size=size,
+        ))
+
+    return sorted(profiles, key=lambda profile: profile.name, reverse=True)
+
+
+def get_profile_path(name: str) -> Optional[Path]:
+    """Путь к профилю или None для имен не из буфера."""
+
+    if not PROFILE_NAME.match(name):
+        return None
+
+    path = get_profiles_dir() / name
+    return path if path.is_file() else None
@@ -1,12 +1,82 @@
 from re import fullmatch
 from typing import List
 
+from django.conf import settings
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from drf_base64.fields import Base64ImageField
+from PIL import Image
 from recipes import models
+from recipes.similarity import queue_similar_recipes
 from rest_framework import serializers, status
 from users.models import Subscription, User
 
+from . import cache
+from .parsers import IMAGE_TOO_LARGE
+
+# Ключ контекста для построения общего для всех пользователей
+# представления: флаги пользователя в нем всегда False, адрес
+# изображения относительный.
+USER_INDEPENDENT = 'user_independent'
+
+
+def get_context_user_ids(context, kind):
+    """Возвращает множество id связей текущего пользователя,
+    запоминая его в контексте на время сериализации."""
+
+    user_ids = context.setdefault('user_ids', {})
+
+    if kind not in user_ids:
+        user_ids[kind] = cache.get_user_ids(context['request'].user.pk, kind)
+
+    return user_ids[kind]
+
+
+def get_sparse_field_names(request, field_names):
+    """Возвращает поля, запрошенные параметрами fields и omit
+    (списки через запятую), в исходном порядке. Поле id сохраняется
+    всегда. Без параметров возвращает None."""
+
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+
+    if not fields and not omit:
+        return None
+
+    names = list(field_names)
+
+    if fields:
+        requested = set(fields.split(','))
+        names = [name for name in names if name in requested]
+
+    if omit:
+        omitted = set(omit.split(','))
+        names = [name for name in names if name not in omitted]
+
+    if 'id' in field_names and 'id' not in names:
+        names.insert(0, 'id')
+
+    return names
+
+
+class SparseFieldsetsMixin:
+    """Оставляет в сериализаторе только поля, запрошенные параметрами
+    fields и omit строки запроса."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+
+        if request is None:
+            return fields
+
+        names = get_sparse_field_names(request, fields)
+
+        if names is None:
+            return fields
+
+        return {name: fields[name] for name in names}
+
 
 class UserSerializer(serializers.ModelSerializer):
 
@@ -23,13 +93,11 @@ class UserSerializer(serializers.ModelSerializer):
 
         user = self.context['request'].user
 
-        if user.is_authenticated:
-            following = user.follower.all().values_list(
-                'following_id', flat=True
+        if user.is_authenticated and not self.context.get(USER_INDEPENDENT):
+            return obj.pk in get_context_user_ids(
+                self.context, cache.FOLLOWING
             )
 
-            return obj.pk in following
-
         return False
 
 
@@ -89,9 +157,21 @@ class WriteRecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ['id', 'amount']
 
 
-class ReadRecipeSerializer(serializers.ModelSerializer):
+class RecipeImageUrlField(serializers.ImageField):
+    """Адрес изображения рецепта. В общем представлении относительный:
+    схема и хост зависят от запроса и добавляются при выдаче."""
+
+    def to_representation(self, value):
+        if not self.context.get(USER_INDEPENDENT):
+            return super().to_representation(value)
+
+        return value.url if value else None
+
+
+class ReadRecipeSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
 
     tags = TagSerializer(many=True, read_only=True)
+    image = RecipeImageUrlField(read_only=True)
     author = UserSerializer(read_only=True)
     ingredients = ReadRecipeIngredientSerializer(
         read_only=True, many=True, source='recipeingredient_related'
@@ -112,13 +192,10 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
 
         user = self.context['request'].user
 
-        if user.is_authenticated:
-            try:
-                return obj.is_favorited
-            except AttributeError:
-                return models.Favorites.objects.filter(
-                    recipe=obj, user=user
-                ).exists()
+        if user.is_authenticated and not self.context.get(USER_INDEPENDENT):
+            return obj.pk in get_context_user_ids(
+                self.context, cache.FAVORITES
+            )
 
         return False
 
@@ -127,20 +204,62 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
 
         user = self.context['request'].user
 
-        if user.is_authenticated:
-            try:
-                return obj.is_in_shopping_cart
-            except AttributeError:
-                return models.ShoppingCart.objects.filter(
-                    recipe=obj, user=user
-                ).exists()
+        if user.is_authenticated and not self.context.get(USER_INDEPENDENT):
+            return obj.pk in get_context_user_ids(
+                self.context, cache.SHOPPING_CART
+            )
 
         return False
 
 
+def get_image_size(file):
+    """Ширина и высота изображения из заголовка файла, без декодирования
+    пикселей. None, если формат не распознан."""
+
+    try:
+        with Image.open(file) as image:
+            return image.size
+    except (OSError, Image.DecompressionBombError):
+        return None
+    finally:
+        file.seek(0)
+
+
+class RecipeImageField(Base64ImageField):
+    """Изображение в base64 из JSON или файл из multipart/form-data.
+    Размер файла и стороны изображения проверяются до полной проверки
+    файла Pillow."""
+
+    default_error_messages = {
+        'too_large': IMAGE_TOO_LARGE,
+        'too_wide': 'Стороны изображения больше {max_dimension} пикселей.',
+    }
+
+    def to_internal_value(self, data):
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+
+        # Base64 длиннее данных в 4/3 раза: большое изображение
+        # отклоняется без декодирования.
+        if isinstance(data, str) and len(data) * 3 // 4 > max_size:
+            self.fail('too_large', max_size=max_size / 2 ** 20)
+
+        data = self._decode(data)
+
+        if getattr(data, 'size', None) and data.size > max_size:
+            self.fail('too_large', max_size=max_size / 2 ** 20)
+
+        size = get_image_size(data) if hasattr(data, 'seek') else None
+        max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+
+        if size is not None and max(size) > max_dimension:
+            self.fail('too_wide', max_dimension=max_dimension)
+
+        return super().to_internal_value(data)
+
+
 class WriteRecipeSerializer(serializers.ModelSerializer):
 
-    image = Base64ImageField()
+    image = RecipeImageField()
     ingredients = WriteRecipeIngredientSerializer(many=True)
     tags = serializers.ListField()
 
@@ -149,13 +268,6 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         fields = ['tags', 'ingredients', 'name', 'image', 'text',
                   'cooking_time'
                   ]
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=models.Recipe.objects.all(),
-                fields=['name', 'text'],
-                message='Рецепт с таким названием или текстом уже доступен.'
-            )
-        ]
 
     def _ingredietns_bulk_create(
         self, recipe: models.Recipe, ingredients: List
@@ -208,6 +320,8 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
 
         models.RecipeTag.objects.bulk_create(bulk_list)
 
+        queue_similar_recipes(new_recipe.pk)
+
         return new_recipe
 
     @transaction.atomic
@@ -232,17 +346,44 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
 
         instance.tags.set(bulk_list)
 
+        queue_similar_recipes(instance.pk)
+
         return super().update(
             instance=instance, validated_data=validated_data
         )
 
     def to_representation(self, value):
 
+        # Ингредиенты загружаются одним запросом, а не по одному
+        # в ReadRecipeIngredientSerializer.
+        prefetch_related_objects(
+            [value], 'recipeingredient_related__ingredient'
+        )
         serializer = ReadRecipeSerializer(value, context=self.context)
         return serializer.data
 
+    def validate_unique_text(self, attrs):
+        """Уникальность пары название и описание проверяется
+        по хэшу описания."""
+
+        name = attrs.get('name', getattr(self.instance, 'name', None))
+        text = attrs.get('text', getattr(self.instance, 'text', ''))
+        recipes = models.Recipe.objects.filter(
+            name=name, text_digest=models.get_text_digest(text)
+        )
+
+        if self.instance is not None:
+            recipes = recipes.exclude(pk=self.instance.pk)
+
+        if recipes.exists():
+            raise serializers.ValidationError(
+                'Рецепт с таким названием или текстом уже доступен.'
+            )
+
     def validate(self, attrs):
 
+        self.validate_unique_text(attrs)
+
         try:
             ingredients = attrs['ingredients']
         except KeyError:
@@ -266,34 +407,21 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'image', 'cooking_time']
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = models.ShoppingCart
-        fields = ['user', 'recipe']
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
 
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=models.ShoppingCart.objects.all(),
-                fields=['user', 'recipe'],
-                message='Рецепт уже в списке покупок.'
-            )
-        ]
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class ServingsSerializer(serializers.ModelSerializer):
 
     class Meta:
-        model = models.Favorites
-        fields = ['user', 'recipe']
-
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=models.Favorites.objects.all(),
-                fields=['user', 'recipe'],
-                message='Рецепт уже в избранном.'
-            )
-        ]
+        model = models.ShoppingCart
+        fields = ['servings']
 
 
 class UserSubscriptionSerializer(serializers.ModelSerializer):
@@ -320,7 +448,7 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
                   ]
 
     def get_is_subscribed(self, obj):
-        return obj.user == self.context['request'].user
+        return obj.user_id == self.context['request'].user.pk
 
     def get_recipes_count(self, obj):
         try:
@@ -340,31 +468,17 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
         return ShortRecipeSerializer(recipes, many=True, read_only=True).data
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class BatchItemSerializer(serializers.Serializer):
 
-    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    following = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.all()
-    )
+    method = serializers.ChoiceField(choices=['GET'], default='GET')
+    url = serializers.CharField()
 
-    class Meta:
-        model = Subscription
-        fields = ['user', 'following']
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=['user', 'following'],
-                message='Вы уже подписаны на этого пользователя'
-            )
-        ]
 
-    def validate(self, data):
-        if self.context['request'].user == data['following']:
-            raise serializers.ValidationError(
-                'Нельзя подписаться на себя')
-        return data
+class BatchSerializer(serializers.Serializer):
+    """Список GET-запросов к API для выполнения одним запросом."""
 
-    def to_representation(self, value):
-
-        serializer = UserSubscriptionSerializer(value, context=self.context)
-        return serializer.data
+    requests = BatchItemSerializer(
+        many=True, allow_empty=False,
+        max_length=settings.BATCH_REQUESTS_LIMIT
+    )
+    parallel = serializers.BooleanField(default=False)
@@ -1,21 +1,36 @@
 import io
+import os
+from functools import lru_cache
 
+import django
 from django.conf import settings
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 
+# ReportLab загружается при первой выгрузке списка покупок или заранее
+# в foodgram.warmup, а не при импорте вьюсетов.
 font_path = settings.BASE_DIR / 'backend_static/data/fonts/DejaVuSans.ttf'
 
 
-def create_pdf(buffer, x_pt, y_pt):
+@lru_cache(maxsize=None)
+def register_font():
+    """Разбирает и регистрирует шрифт один раз на процесс."""
+
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
 
-    pdf = canvas.Canvas(buffer)
     pdfmetrics.registerFont(TTFont(
         'DejaVuSans',
         font_path,
         'utf-8'
     ))
+
+
+def create_pdf(buffer, x_pt, y_pt):
+    from reportlab.pdfgen import canvas
+
+    register_font()
+    pdf = canvas.Canvas(buffer)
     pdf.setFont('DejaVuSans', 14)
     pdf.drawString(x_pt, y_pt, 'Список покупок')
 
@@ -26,7 +41,9 @@ def fill_pdf(pdf, ingredients_qs, x_pt, y_pt):
 
     for ingredient in ingredients_qs:
 
-        name, unit, amount = ingredient.values()
+        name = ingredient['name']
+        unit = ingredient['measurement_unit']
+        amount = ingredient['amount']
 
         if y_pt < 57 and x_pt == 382:
             pdf.showPage()
@@ -65,3 +82,34 @@ def get_shopping_list(shopping_list):
     pdf.save()
     buffer.seek(0)
     return buffer
+
+
+def get_shopping_list_name(label, user_id):
+    return os.path.join(settings.SHOPPING_LISTS_DIR, label, f'{user_id}.pdf')
+
+
+# Функции воркеров пакетной подготовки списков (api.shopping_lists).
+# Модуль не импортирует модели: воркер запускается через spawn
+# и настраивает Django в init_worker до получения первой задачи.
+
+def init_worker():
+    django.setup()
+    register_font()
+
+
+def save_shopping_lists(label, shopping_lists):
+    """Рисует и сохраняет в media PDF списков [(user_id, список), ...].
+    Возвращает их общий размер."""
+
+    size = 0
+
+    for user_id, shopping_list in shopping_lists:
+        content = get_shopping_list(shopping_list).getvalue()
+        name = get_shopping_list_name(label, user_id)
+        # Повторный запуск перезаписывает файлы, а не создает копии
+        # с суффиксами.
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(content))
+        size += len(content)
+
+    return size
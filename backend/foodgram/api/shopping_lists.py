@@ -0,0 +1,106 @@
+"""Пакетная подготовка списков покупок в PDF.
+
+Id пользователей с непустым списком покупок читаются серверным
+курсором и делятся на пачки. Сводные списки пачки считаются одним
+запросом, сгруппированным по пользователю, и передаются в пул
+процессов. Воркер регистрирует шрифт один раз при запуске, рисует PDF
+и сохраняет файлы в хранилище media. Число пачек в работе ограничено,
+поэтому память не растет с числом пользователей.
+"""
+import multiprocessing
+import time
+from concurrent.futures import (ALL_COMPLETED, FIRST_COMPLETED,
+                                ProcessPoolExecutor, wait)
+from dataclasses import dataclass
+from itertools import groupby, islice
+from operator import itemgetter
+from typing import Iterator, List, Tuple
+
+from recipes.models import ShoppingCart
+
+from .shopping_list_pdf import init_worker, save_shopping_lists
+
+ShoppingLists = List[Tuple[int, List[dict]]]
+
+
+@dataclass
+class GenerationStats:
+    users: int = 0
+    size: int = 0
+    elapsed: float = 0
+
+    @property
+    def throughput(self) -> float:
+        return self.users / self.elapsed if self.elapsed else 0
+
+
+def iter_user_batches(batch_size: int) -> Iterator[List[int]]:
+    user_ids = ShoppingCart.objects.filter(
+        user__deleted_at__isnull=True
+    ).order_by('user_id').values_list(
+        'user_id', flat=True
+    ).distinct().iterator(chunk_size=batch_size)
+
+    while True:
+        batch = list(islice(user_ids, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def get_shopping_lists(user_ids: List[int]) -> ShoppingLists:
+    """Сводные списки пользователей одним запросом."""
+
+    rows = ShoppingCart.objects.filter(
+        user_id__in=user_ids
+    ).shopping_list('user_id')
+
+    return [
+        (user_id, [
+            {
+                'name': row['name'],
+                'measurement_unit': row['measurement_unit'],
+                'amount': row['amount'],
+            }
+            for row in group
+        ])
+        for user_id, group in groupby(rows, key=itemgetter('user_id'))
+    ]
+
+
+def generate_shopping_lists(
+    label: str, workers: int, batch_size: int
+) -> GenerationStats:
+    """Готовит PDF всех непустых списков покупок в каталоге label."""
+
+    stats = GenerationStats()
+    started = time.perf_counter()
+    pending = {}
+
+    def collect(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            stats.size += future.result()
+            stats.users += pending.pop(future)
+
+    # Воркеры запускаются через spawn: при fork они получили бы
+    # открытое соединение с базой и курсор родителя.
+    with ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker
+    ) as executor:
+        for user_ids in iter_user_batches(batch_size):
+            shopping_lists = get_shopping_lists(user_ids)
+            future = executor.submit(
+                save_shopping_lists, label, shopping_lists
+            )
+            pending[future] = len(shopping_lists)
+
+            # Пока воркеры заняты, следующие пачки не запрашиваются.
+            if len(pending) >= workers * 2:
+                collect(FIRST_COMPLETED)
+
+        collect(ALL_COMPLETED)
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -0,0 +1,95 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from foodgram.soft_delete import soft_deleted
+from recipes import models
+from users.models import Subscription, User
+
+from .cache import (FAVORITES, FOLLOWING, SHOPPING_CART, invalidate_recipes,
+                    invalidate_user_ids)
+from .suggestions import invalidate_ingredient_index
+
+AUTH_ONLY_FIELDS = frozenset(('last_login', 'password'))
+
+
+@receiver(post_save, sender=models.Recipe)
+@receiver(post_delete, sender=models.Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=models.Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    # Рецепт без строки популярности не попал бы в сортировку по ней.
+    if created:
+        models.RecipeScore.objects.bulk_create(
+            [models.RecipeScore(recipe_id=instance.pk)], ignore_conflicts=True
+        )
+
+
+# Вид связи пользователя, множество id которой хранится в кэше.
+USER_IDS_KINDS = {
+    models.Favorites: FAVORITES,
+    models.ShoppingCart: SHOPPING_CART,
+    Subscription: FOLLOWING,
+}
+
+
+@receiver(post_save, sender=models.Favorites)
+@receiver(post_delete, sender=models.Favorites)
+@receiver(post_save, sender=models.ShoppingCart)
+@receiver(post_delete, sender=models.ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def user_relation_changed(sender, instance, **kwargs):
+    """Изменения связей из админки, при очистке удаленных объектов
+    и каскадном удалении. Запросы API без сигналов (insert_or_ignore,
+    delete_returning) сбрасывают кэш сами."""
+
+    invalidate_user_ids(instance.user_id, USER_IDS_KINDS[sender])
+
+
+@receiver(soft_deleted, sender=models.Recipe)
+def recipes_deleted(sender, pks, **kwargs):
+    # Отдельный рецепт отдается из кэша без запроса к базе.
+    invalidate_recipes(pks)
+
+
+def touch_recipes(pks):
+    """Связанный объект входит в представление рецептов: их кэш
+    сбрасывается, а дата изменения обновляется для условных запросов.
+    pks - запрос id рецептов, выполняется подзапросом в UPDATE."""
+
+    models.Recipe.objects.filter(pk__in=pks).update(
+        updated_at=timezone.now()
+    )
+    invalidate_recipes(pks)
+
+
+@receiver(post_save, sender=models.Tag)
+@receiver(pre_delete, sender=models.Tag)
+def tag_changed(sender, instance, **kwargs):
+    touch_recipes(instance.recipes.values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=models.Ingredient)
+@receiver(pre_delete, sender=models.Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    touch_recipes(instance.recipes.values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=models.Ingredient)
+@receiver(post_delete, sender=models.Ingredient)
+def ingredient_index_changed(sender, **kwargs):
+    invalidate_ingredient_index()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    """Автор входит в представление рецепта, поэтому изменение
+    его данных обновляет все его рецепты."""
+
+    if created or (update_fields and update_fields <= AUTH_ONLY_FIELDS):
+        return
+
+    touch_recipes(instance.recipes.values_list('pk', flat=True))
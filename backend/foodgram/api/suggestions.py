@@ -0,0 +1,265 @@
+"""Поиск ингредиентов по началу названия с исправлением раскладки
+и опечаток.
+
+Индекс хранится в памяти процесса: отсортированный список названий для
+поиска по префиксу и инвертированный индекс триграмм для нечеткого
+поиска. Запрос, набранный в английской раскладке вместо русской
+(и наоборот), переводится в другую раскладку. Если совпадений по
+префиксу меньше INGREDIENT_SUGGESTIONS_LIMIT, список дополняется
+ближайшими по расстоянию Левенштейна названиями из кандидатов
+с наибольшим числом общих триграмм.
+
+Порядок выдачи: совпадения по префиксу, затем исправленные опечатки
+по возрастанию расстояния; внутри групп - по числу рецептов
+с ингредиентом. Индекс перестраивается при изменении ингредиентов
+(версия хранится в кэше и общая для процессов) и раз в
+INGREDIENT_INDEX_TTL секунд для обновления числа рецептов.
+Перестройка идет в фоновом потоке, запросы до ее окончания ищут
+по прежнему индексу; синхронно индекс строится только при первом
+обращении.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models import Count
+from recipes.models import Ingredient, RecipeIngredient
+
+INDEX_VERSION_KEY = 'ingredient_index_version'
+
+GRAM_SIZE = 3
+
+# Число кандидатов с наибольшим числом общих триграмм, для которых
+# считается расстояние редактирования.
+FUZZY_CANDIDATES = 32
+
+# Нечеткий поиск выполняется для запросов не короче этой длины.
+FUZZY_MIN_LENGTH = 3
+
+EN_LAYOUT = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+RU_LAYOUT = 'йцукенгшщзхъфывапролджэячсмитьбюё'
+LAYOUT_SWITCH = {
+    **dict(zip(EN_LAYOUT, RU_LAYOUT)),
+    **dict(zip(RU_LAYOUT, EN_LAYOUT)),
+}
+
+
+def normalize(value: str) -> str:
+    return value.strip().lower().replace('ё', 'е')
+
+
+def switch_layout(value: str) -> str:
+    return ''.join(LAYOUT_SWITCH.get(char, char) for char in value)
+
+
+def get_grams(value: str) -> List[str]:
+    padded = f'{" " * (GRAM_SIZE - 1)}{value} '
+    return [
+        padded[num:num + GRAM_SIZE]
+        for num in range(len(padded) - GRAM_SIZE + 1)
+    ]
+
+
+def prefix_distance(query: str, key: str, bound: int) -> int:
+    """Наименьшее расстояние Левенштейна от запроса до начала key
+    любой длины или bound + 1, если оно больше bound. Считается только
+    полоса шириной 2 * bound + 1 вокруг диагонали, значения вне нее
+    заменяются на bound + 1."""
+
+    length = len(query)
+    key = key[:length + bound]
+    width = len(key)
+    over = bound + 1
+
+    if width < length - bound:
+        return over
+
+    previous = list(range(over)) + [over] * (width + 1 - over)
+
+    for row in range(1, length + 1):
+        char = query[row - 1]
+        current = [over] * (width + 1)
+        best = current[0] = row if row < over else over
+
+        # Вызовы min в цикле заметно медленнее сравнений.
+        for column in range(max(1, row - bound), min(width, row + bound) + 1):
+            value = previous[column - 1] + (char != key[column - 1])
+            if previous[column] < value:
+                value = previous[column] + 1
+            if current[column - 1] < value:
+                value = current[column - 1] + 1
+            current[column] = value
+            if value < best:
+                best = value
+
+        if best > bound:
+            return over
+        previous = current
+
+    return min(min(previous), over)
+
+
+class IngredientIndex:
+
+    def __init__(self, ingredients, usage: Dict[int, int], version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+
+        rows = sorted(
+            (normalize(name), pk, usage.get(pk, 0))
+            for pk, name in ingredients
+        )
+        self.keys = [key for key, _, _ in rows]
+        self.ids = [pk for _, pk, _ in rows]
+        self.usage = [count for _, _, count in rows]
+        self.grams = defaultdict(list)
+
+        for position, key in enumerate(self.keys):
+            for gram in set(get_grams(key)):
+                self.grams[gram].append(position)
+
+    def is_stale(self, version: int) -> bool:
+        return version != self.version or (
+            time.monotonic() - self.built_at > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def prefix_matches(self, query: str) -> range:
+        start = bisect_left(self.keys, query)
+        end = bisect_left(self.keys, query + '\uffff', lo=start)
+        return range(start, end)
+
+    def fuzzy_matches(self, query: str) -> Dict[int, Tuple[int, int]]:
+        """Позиции названий, начало которых отличается от запроса
+        не более чем на INGREDIENT_SEARCH_MAX_DISTANCE правок,
+        с расстоянием и числом общих триграмм."""
+
+        bound = min(
+            settings.INGREDIENT_SEARCH_MAX_DISTANCE, len(query) // 3
+        )
+        grams = set(get_grams(query))
+        # Каждая правка затрагивает не больше GRAM_SIZE триграмм,
+        # завершающая триграмма запроса у начала названия не совпадает.
+        min_shared = len(grams) - 1 - GRAM_SIZE * bound
+        shared = Counter()
+
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+
+        matches = {}
+
+        for position, count in heapq.nlargest(
+            FUZZY_CANDIDATES, shared.items(), key=itemgetter(1)
+        ):
+            if count < min_shared:
+                break
+            distance = prefix_distance(query, self.keys[position], bound)
+            if distance <= bound:
+                matches[position] = (distance, -count)
+
+        return matches
+
+    def search(self, value: str, limit: Optional[int] = None) -> List[int]:
+        """id ингредиентов в порядке выдачи. Совпадения по префиксу
+        выдаются все, нечеткие дополняют список до limit."""
+
+        if limit is None:
+            limit = settings.INGREDIENT_SUGGESTIONS_LIMIT
+
+        query = normalize(value)
+        queries = list(dict.fromkeys((query, switch_layout(query))))
+        prefix = set()
+
+        for variant in queries:
+            prefix.update(self.prefix_matches(variant))
+
+        result = sorted(prefix, key=lambda pos: (-self.usage[pos], pos))
+
+        if len(result) < limit and len(query) >= FUZZY_MIN_LENGTH:
+            fuzzy = {}
+            for variant in queries:
+                for position, rank in self.fuzzy_matches(variant).items():
+                    if position not in prefix:
+                        fuzzy[position] = min(rank, fuzzy.get(position, rank))
+
+            result.extend(sorted(fuzzy, key=lambda pos: (
+                fuzzy[pos][0], -self.usage[pos], fuzzy[pos][1], pos
+            ))[:limit - len(result)])
+
+        return [self.ids[position] for position in result]
+
+
+def get_index_cache():
+    return caches[settings.INGREDIENT_INDEX_CACHE_ALIAS]
+
+
+def build_ingredient_index(version: int) -> IngredientIndex:
+    usage = dict(RecipeIngredient.objects.values(
+        'ingredient_id'
+    ).annotate(count=Count('pk')).values_list('ingredient_id', 'count'))
+
+    return IngredientIndex(
+        Ingredient.objects.values_list('pk', 'name').iterator(),
+        usage, version
+    )
+
+
+class ProcessIndex:
+    """Индекс процесса, перестраиваемый при смене версии или по TTL."""
+
+    def __init__(self):
+        self.index = None
+        self.lock = threading.Lock()
+        self.rebuilding = False
+
+    def rebuild(self, version: int) -> None:
+        try:
+            self.index = build_ingredient_index(version)
+        finally:
+            self.rebuilding = False
+            # Соединения потока не используются после его завершения.
+            connections.close_all()
+
+    def get(self) -> IngredientIndex:
+        version = get_index_cache().get(INDEX_VERSION_KEY, 0)
+
+        if self.index is None:
+            with self.lock:
+                if self.index is None:
+                    self.index = build_ingredient_index(version)
+        elif self.index.is_stale(version) and not self.rebuilding:
+            with self.lock:
+                if not self.rebuilding:
+                    self.rebuilding = True
+                    threading.Thread(
+                        target=self.rebuild, args=(version,), daemon=True
+                    ).start()
+
+        return self.index
+
+
+_process_index = ProcessIndex()
+
+
+def get_ingredient_index() -> IngredientIndex:
+    return _process_index.get()
+
+
+def _bump_index_version():
+    cache = get_index_cache()
+    cache.add(INDEX_VERSION_KEY, 0, timeout=None)
+
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_ingredient_index() -> None:
+    transaction.on_commit(_bump_index_version)
@@ -0,0 +1,83 @@
+from django.test import TestCase
+from django.urls import reverse
+from recipes.models import Favorites, Recipe
+from users.models import User
+
+FAVORITES = 45
+
+
+class PaginatedInlineTest(TestCase):
+    """Инлайн избранного на странице рецепта в админке выводит одну
+    страницу, число объектов и ссылки на остальные страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.admin, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image.png'
+        )
+        users = User.objects.bulk_create(
+            User(username=f'user{num}', email=f'user{num}@example.com')
+            for num in range(FAVORITES)
+        )
+        Favorites.objects.bulk_create(
+            Favorites(recipe=cls.recipe, user=user) for user in users
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse(
+            'admin:recipes_recipe_change', args=[self.recipe.pk]
+        )
+
+    def get_formset(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        formset, = (
+            inline.formset
+            for inline in response.context['inline_admin_formsets']
+            if inline.formset.model is Favorites
+        )
+        return response, formset
+
+    def test_first_page(self):
+        response, formset = self.get_formset()
+
+        self.assertEqual(len(formset.forms), 20)
+        self.assertEqual(formset.total, FAVORITES)
+        self.assertIsNone(formset.previous_page_url)
+        self.assertContains(response, f'1–20 из {FAVORITES}')
+        self.assertContains(response, 'favorites_page=2')
+        self.assertContains(
+            response,
+            reverse('admin:recipes_favorites_changelist')
+            + f'?recipe__id__exact={self.recipe.pk}'
+        )
+
+    def test_last_page(self):
+        response, formset = self.get_formset(favorites_page=3)
+
+        self.assertEqual(len(formset.forms), 5)
+        self.assertIsNone(formset.next_page_url)
+        self.assertContains(response, f'41–45 из {FAVORITES}')
+        self.assertContains(response, 'favorites_page=2')
+
+    def test_page_past_the_end_shows_last_page(self):
+        _, formset = self.get_formset(favorites_page=10)
+
+        self.assertEqual(formset.current_page, 3)
+        self.assertEqual(len(formset.forms), 5)
+
+    def test_changelist_link_filters_by_recipe(self):
+        response = self.client.get(
+            reverse('admin:recipes_favorites_changelist'),
+            {'recipe__id__exact': self.recipe.pk}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['cl'].queryset.count(), FAVORITES
+        )
@@ -0,0 +1,99 @@
+from api.nplusone import NPlusOneError, NPlusOneTestMixin
+from django.core.cache import caches
+from django.test import TestCase
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscription, User
+
+AUTHORS = 4
+
+
+class NPlusOneTest(NPlusOneTestMixin, TestCase):
+    """Списки и детальные представления API выполняют число запросов,
+    не зависящее от числа объектов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {num}', color=f'#00000{num}', slug=f'tag{num}'
+            )
+            for num in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {num}', measurement_unit='г'
+            )
+            for num in range(3)
+        ]
+
+        for num in range(AUTHORS):
+            author = User.objects.create_user(
+                username=f'author{num}', email=f'author{num}@example.com',
+                password='password'
+            )
+            Subscription.objects.create(user=cls.user, following=author)
+            for recipe_num in range(3):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'Рецепт {num}-{recipe_num}',
+                    text=f'Описание {num}-{recipe_num}', cooking_time=10,
+                    image='recipes/image.png'
+                )
+                recipe.tags.set(tags)
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe=recipe, ingredient=ingredient, amount=10
+                    )
+                    for ingredient in ingredients
+                )
+                Favorites.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+        cls.recipe = recipe
+        cls.token = Token.objects.create(user=cls.user).key
+
+    def setUp(self):
+        super().setUp()
+        # Представления рецептов и множества связей кэшируются между
+        # тестами, без очистки запросы к базе не выполнялись бы.
+        for cache in caches.all():
+            cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def assert_ok(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_recipe_list(self):
+        self.assert_ok('/api/recipes/')
+
+    def test_recipe_list_anonymous(self):
+        self.client.credentials()
+        self.assert_ok('/api/recipes/')
+
+    def test_recipe_list_filtered(self):
+        self.assert_ok('/api/recipes/?is_favorited=1&is_in_shopping_cart=1')
+
+    def test_recipe_detail(self):
+        self.assert_ok(f'/api/recipes/{self.recipe.pk}/')
+
+    def test_subscriptions(self):
+        self.assert_ok('/api/users/subscriptions/')
+
+    def test_subscriptions_recipes_limit(self):
+        self.assert_ok('/api/users/subscriptions/?recipes_limit=2')
+
+    def test_users(self):
+        self.assert_ok('/api/users/')
+
+    def test_detects_lazy_loads(self):
+        with self.assertRaises(NPlusOneError):
+            with self.assert_no_n_plus_one():
+                for recipe in Recipe.objects.all():
+                    recipe.author.username
@@ -0,0 +1,73 @@
+from django.core.cache import caches
+from django.test import TestCase
+from recipes.models import Favorites, Recipe, ShoppingCart
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscription, User
+
+
+class RelationsCacheTest(TestCase):
+    """Флаги пользователя в представлении рецепта следуют за связями,
+    измененными в обход API: из админки и каскадным удалением."""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image.png'
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+
+    def get_flags(self):
+        data = self.client.get(f'/api/recipes/{self.recipe.pk}/').data
+        return (
+            data['is_favorited'], data['is_in_shopping_cart'],
+            data['author']['is_subscribed']
+        )
+
+    def change(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+
+    def test_flags_follow_model_changes(self):
+        self.assertEqual(self.get_flags(), (False, False, False))
+
+        self.change(lambda: (
+            Favorites.objects.create(user=self.user, recipe=self.recipe),
+            ShoppingCart.objects.create(user=self.user, recipe=self.recipe),
+            Subscription.objects.create(
+                user=self.user, following=self.author
+            ),
+        ))
+        self.assertEqual(self.get_flags(), (True, True, True))
+
+        self.change(lambda: (
+            Favorites.objects.all().delete(),
+            ShoppingCart.objects.all().delete(),
+            Subscription.objects.all().delete(),
+        ))
+        self.assertEqual(self.get_flags(), (False, False, False))
+
+    def test_api_changes_reset_flags(self):
+        self.assertEqual(self.get_flags(), (False, False, False))
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.get_flags(), (True, False, False))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.get_flags(), (False, False, False))
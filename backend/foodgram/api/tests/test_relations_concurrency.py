@@ -0,0 +1,97 @@
+import threading
+
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from recipes.models import Favorites, Recipe, ShoppingCart
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscription, User
+
+THREADS = 8
+
+
+class RelationsConcurrencyTest(TransactionTestCase):
+    """Одновременные добавления и удаления избранного, списка покупок
+    и подписки: уникальность проверяет база, ответы только 201, 204
+    или 400, ровно одна строка добавляется и удаляется."""
+
+    def setUp(self):
+        # Проверяется после создания тестовой базы: на этапе импорта
+        # настроена еще рабочая.
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest(
+                'in-memory SQLite with shared cache reports table locks '
+                'instead of waiting for them'
+            )
+
+        for cache in caches.all():
+            cache.clear()
+
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image.png'
+        )
+        self.token = Token.objects.create(user=self.user).key
+
+    def send_concurrently(self, method, url):
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+        errors = []
+
+        def send():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+            try:
+                barrier.wait()
+                response = getattr(client, method)(url)
+                statuses.append(response.status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=send) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        return sorted(statuses)
+
+    def assert_add_and_delete(self, url, model, **filters):
+        statuses = self.send_concurrently('post', url)
+        self.assertEqual(sorted(set(statuses)), [201, 400])
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(model.objects.filter(**filters).count(), 1)
+
+        statuses = self.send_concurrently('delete', url)
+        self.assertEqual(sorted(set(statuses)), [204, 400])
+        self.assertEqual(statuses.count(204), 1)
+        self.assertFalse(model.objects.filter(**filters).exists())
+
+    def test_favorite(self):
+        self.assert_add_and_delete(
+            f'/api/recipes/{self.recipe.pk}/favorite/', Favorites,
+            user=self.user, recipe=self.recipe
+        )
+
+    def test_shopping_cart(self):
+        self.assert_add_and_delete(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/', ShoppingCart,
+            user=self.user, recipe=self.recipe
+        )
+
+    def test_subscribe(self):
+        self.assert_add_and_delete(
+            f'/api/users/{self.author.pk}/subscribe/', Subscription,
+            user=self.user, following=self.author
+        )
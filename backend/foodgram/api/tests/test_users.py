@@ -0,0 +1,53 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+from users.models import User
+
+USER_DATA = {
+    'username': 'user',
+    'email': 'user@example.com',
+    'first_name': 'Имя',
+    'last_name': 'Фамилия',
+    'password': 'Secret-password-1',
+}
+
+
+class SoftDeletedUserTest(TestCase):
+    """Имя и email удаленного пользователя можно снова указать при
+    регистрации."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def register(self):
+        return self.client.post('/api/users/', USER_DATA, format='json')
+
+    def test_register_after_soft_delete(self):
+        self.assertEqual(self.register().status_code, 201)
+        deleted = User.objects.get(email=USER_DATA['email'])
+        deleted.delete()
+
+        response = self.register()
+
+        self.assertEqual(response.status_code, 201)
+        deleted = User._base_manager.get(pk=deleted.pk)
+        self.assertIsNotNone(deleted.deleted_at)
+        self.assertFalse(deleted.is_active)
+        self.assertEqual(deleted.username, f'deleted:{deleted.pk}')
+        self.assertEqual(
+            deleted.email, f'deleted:{deleted.pk}@deleted.invalid'
+        )
+        self.assertEqual(
+            User.objects.get(email=USER_DATA['email']).username,
+            USER_DATA['username']
+        )
+
+    def test_deleted_login_cannot_be_registered(self):
+        response = self.client.post('/api/users/', {
+            **USER_DATA, 'username': 'deleted:1',
+            'email': 'deleted:1@deleted.invalid'
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            set(response.data), {'username', 'email'}
+        )
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Троттлинг по алгоритму token bucket для эндпоинтов с throttle_scope.
+    Частота задается в DEFAULT_THROTTLE_RATES под ключом
+    '<throttle_scope>_<ident_kind>', например 'favorite_user': '30/min'.
+    Состояние корзины хранится в кэше THROTTLE_CACHE_ALIAS:
+    локальном по умолчанию или общем для всех процессов."""
+
+    cache = caches[settings.THROTTLE_CACHE_ALIAS]
+    ident_kind = None
+
+    def __init__(self):
+        # Частота определяется в allow_request по throttle_scope вьюсета.
+        pass
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+
+        if not scope:
+            return True
+
+        self.scope = f'{scope}_{self.ident_kind}'
+
+        if self.scope not in self.THROTTLE_RATES:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        refill_rate = self.num_requests / self.duration
+        tokens, updated = self.cache.get(self.key, (self.num_requests, now))
+        tokens = min(
+            self.num_requests, tokens + (now - updated) * refill_rate
+        )
+
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / refill_rate
+            return False
+
+        self.cache.set(self.key, (tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    ident_kind = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user.is_authenticated:
+            return None
+
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': request.user.pk
+        }
+
+
+class IpTokenBucketThrottle(TokenBucketThrottle):
+    ident_kind = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
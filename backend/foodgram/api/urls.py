@@ -12,7 +12,8 @@ router.register(r'users', views.FoodgramUserViewSet)
 
 
 urlpatterns = [
-    path('auth/', include('djoser.urls.authtoken'))
+    path('auth/', include('djoser.urls.authtoken')),
+    path('batch/', views.BatchView.as_view(), name='batch'),
 ]
 
 urlpatterns += router.urls
@@ -1,20 +1,56 @@
-from django.db.models import Count, Exists, OuterRef, Sum, Value
-from django.http import FileResponse
+import contextvars
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections, transaction
+from django.db.models import Count, Max, OuterRef, Prefetch, Q, Subquery
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
+from foodgram.db import delete_returning, insert_or_ignore
+from foodgram.db_routers import PRIMARY
 from recipes import models
 from rest_framework import response, status
 from rest_framework.decorators import action
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 from users.models import Subscription, User
 
-from . import permissions, serializers
-from .filters import IngredientSearchFilter, RecipeFilter
+from . import cache, permissions, serializers
+from .filters import SCORE_ORDERING, IngredientSearchFilter, RecipeFilter
+from .nplusone import track_subrequest
+from .parsers import MultiPartJSONParser
 from .shopping_list_pdf import get_shopping_list
+from .throttling import IpTokenBucketThrottle, UserTokenBucketThrottle
+
+RELATION_THROTTLES = [UserTokenBucketThrottle, IpTokenBucketThrottle]
+
+# Время изменения пустого списка рецептов.
+EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+
+def get_lookup_id(value):
+    """Id объекта из адреса запроса, 404 для нечисловых значений."""
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404
 
 
 class BaseListRetrieveViewSet(
@@ -27,6 +63,8 @@ class BaseListRetrieveViewSet(
 class FoodgramUserViewSet(UserViewSet):
     """Вьюсет для работы с эндпоинтом /users/ и производными."""
 
+    throttle_scope = None
+
     @action(
         methods=['get'], detail=False,
         filter_backends=[DjangoFilterBackend],
@@ -35,10 +73,7 @@ class FoodgramUserViewSet(UserViewSet):
     def subscriptions(self, request):
         """Метод получения списка интересующих авторов."""
 
-        user_following_qs = request.user.follower.all().annotate(
-            recipes_count=Count('following__recipes')
-        )
-        qs = self.paginate_queryset(user_following_qs)
+        qs = self.paginate_queryset(self.get_subscriptions_queryset())
         serializer = serializers.UserSubscriptionSerializer(
             qs, many=True,
             context={
@@ -49,19 +84,64 @@ class FoodgramUserViewSet(UserViewSet):
         )
         return self.get_paginated_response(serializer.data)
 
+    def get_subscriptions_queryset(self):
+        """Подписки пользователя с рецептами авторов и их числом."""
+
+        recipes = models.Recipe.objects.all()
+        recipes_limit = self.request.query_params.get('recipes_limit')
+
+        # Первые recipes_limit рецептов каждого автора одним запросом.
+        if recipes_limit:
+            recipes = recipes.filter(pk__in=Subquery(
+                models.Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:int(recipes_limit)]
+            ))
+
+        return self.request.user.follower.filter(
+            following__deleted_at__isnull=True
+        ).select_related('following').prefetch_related(
+            Prefetch('following__recipes', queryset=recipes)
+        ).annotate(recipes_count=Count(
+            'following__recipes',
+            filter=Q(following__recipes__deleted_at__isnull=True)
+        ))
+
     @action(
         methods=['post'], detail=True,
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        throttle_classes=RELATION_THROTTLES, throttle_scope='subscribe'
     )
     def subscribe(self, request, id):
         """Метод подписки на автора или отписки."""
 
-        serializer = serializers.SubscriptionSerializer(
-            data={'following': id}, context={'request': self.request}
+        following = get_object_or_404(User, pk=get_lookup_id(id))
+
+        if following == request.user:
+            return response.Response(
+                {'non_field_errors': ['Нельзя подписаться на себя']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        subscription = Subscription(
+            user=request.user, following=following, sub_date=timezone.now()
         )
 
-        serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user)
+        if not insert_or_ignore(
+            Subscription, user=request.user.pk, following=following.pk,
+            sub_date=subscription.sub_date
+        ):
+            return response.Response(
+                {'non_field_errors': [
+                    'Вы уже подписаны на этого пользователя'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache.invalidate_user_ids(request.user.pk, cache.FOLLOWING)
+        serializer = serializers.UserSubscriptionSerializer(
+            subscription, context={'request': self.request}
+        )
 
         return response.Response(
             serializer.data, status=status.HTTP_201_CREATED
@@ -70,21 +150,19 @@ class FoodgramUserViewSet(UserViewSet):
     @subscribe.mapping.delete
     def subscribe_delete(self, request, id):
 
-        following = get_object_or_404(User, pk=id)
-
-        instance = Subscription.objects.filter(
-            user=request.user, following=following
-        )
-
-        if instance.exists():
+        id = get_lookup_id(id)
 
-            instance.delete()
-            return response.Response(status=status.HTTP_204_NO_CONTENT)
+        if not delete_returning(
+            Subscription, user=request.user.pk, following=id
+        ):
+            get_object_or_404(User, pk=id)
+            return response.Response(
+                {"error": "Вы не были подписаны на этого пользователя"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        return response.Response(
-            {"error": "Вы не были подписаны на этого пользователя"},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        cache.invalidate_user_ids(request.user.pk, cache.FOLLOWING)
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class TagViewSet(BaseListRetrieveViewSet):
@@ -117,38 +195,188 @@ class RecipeViewSet(ModelViewSet):
     ]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    parser_classes = [JSONParser, MultiPartJSONParser]
+    throttle_scope = None
 
     def get_queryset(self):
+        return models.Recipe.objects.select_related(
+            'author'
+        ).prefetch_related(
+            'ingredients', 'tags'
+        ).all()
+
+    def get_representation_queryset(self, fields):
+        """Запрос для сериализации рецептов, загружающий только связи,
+        нужные для запрошенных полей."""
+
+        queryset = models.Recipe.objects.all()
+        prefetch = []
+
+        if fields is None or 'author' in fields:
+            queryset = queryset.select_related('author')
+        if fields is None or 'ingredients' in fields:
+            prefetch.append('recipeingredient_related__ingredient')
+        if fields is None or 'tags' in fields:
+            prefetch.append('tags')
+
+        return queryset.prefetch_related(*prefetch)
+
+    def get_recipe_representations(self, pks):
+        """Собирает представления рецептов из кэша, дополняя их флагами
+        текущего пользователя. Отсутствующие в кэше рецепты
+        сериализуются одним запросом и кэшируются.
+        Для запросов с fields или omit сериализуются только запрошенные
+        поля, такие представления не кэшируются."""
+
+        fields = serializers.get_sparse_field_names(
+            self.request, serializers.ReadRecipeSerializer.Meta.fields
+        )
+        bodies = cache.get_recipe_bodies(pks)
+        missing = [pk for pk in pks if pk not in bodies]
+
+        if missing:
+            # Кэш заполняется с основной базы: отстающая реплика
+            # закэшировала бы устаревшее представление.
+            recipes = self.get_representation_queryset(
+                fields
+            ).using(PRIMARY).filter(pk__in=missing)
+
+            context = self.get_serializer_context()
+            context[serializers.USER_INDEPENDENT] = True
+            serializer = serializers.ReadRecipeSerializer(
+                recipes, many=True, context=context
+            )
+
+            fresh = {body['id']: body for body in serializer.data}
+            if fields is None:
+                cache.set_recipe_bodies(fresh)
+            bodies.update(fresh)
+
+        bodies = [bodies[pk] for pk in pks if pk in bodies]
+
+        if fields is not None:
+            bodies = [{name: body[name] for name in fields} for body in bodies]
 
         user = self.request.user
+        flags = {
+            'is_favorited': cache.FAVORITES,
+            'is_in_shopping_cart': cache.SHOPPING_CART,
+            'author': cache.FOLLOWING,
+        }
+
+        for field, kind in flags.items():
+            if user.is_anonymous or fields is not None and field not in fields:
+                flags[field] = ()
+            else:
+                flags[field] = cache.get_user_ids(user.pk, kind)
+
+        return cache.apply_user_flags(
+            bodies, flags['is_favorited'],
+            flags['is_in_shopping_cart'], flags['author'],
+            self.request.build_absolute_uri
+        )
 
-        if user.is_anonymous:
-            return models.Recipe.objects.select_related(
-                'author'
-            ).prefetch_related(
-                'ingredients', 'tags'
-            ).annotate(
-                is_favorited=Value(False),
-                is_in_shopping_cart=Value(False)
-            ).all()
+    def get_validators(self, updated_at, *state):
+        """ETag и Last-Modified представления рецептов.
+        Флаги в представлении зависят от пользователя, поэтому в ETag
+        входят его избранное, список покупок и подписки, а Last-Modified,
+        который их не учитывает, отдается только анонимным
+        пользователям и только для отдельного рецепта."""
 
-        is_favorited_qs = models.Favorites.objects.filter(
-            user=user,
-            recipe_id=OuterRef('pk')
+        user = self.request.user
+        parts = [updated_at.isoformat(), *map(str, state)]
+
+        if user.is_authenticated:
+            for kind in (
+                cache.FAVORITES, cache.SHOPPING_CART, cache.FOLLOWING
+            ):
+                parts.append(','.join(
+                    map(str, sorted(cache.get_user_ids(user.pk, kind)))
+                ))
+
+        etag = quote_etag(
+            hashlib.sha256('|'.join(parts).encode()).hexdigest()[:32]
         )
-        shopping_cart_qs = models.ShoppingCart.objects.filter(
-            user=user,
-            recipe_id=OuterRef('pk')
+
+        if user.is_authenticated:
+            return etag, None
+
+        return etag, int(updated_at.timestamp())
+
+    def conditional_response(self, data, etag, last_modified):
+        """Ответ 304 при совпадении валидаторов с заголовками
+        If-None-Match или If-Modified-Since, иначе ответ с data,
+        построенным только в этом случае."""
+
+        result = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
         )
 
-        return models.Recipe.objects.select_related(
-            'author'
-        ).prefetch_related(
-            'ingredients', 'tags'
-        ).annotate(
-            is_favorited=Exists(is_favorited_qs),
-            is_in_shopping_cart=Exists(shopping_cart_qs)
-        ).all()
+        if result is None:
+            result = response.Response(data())
+
+        result.headers['ETag'] = etag
+        if last_modified is not None:
+            result.headers['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(result, ['Authorization'])
+
+        return result
+
+    def get_list_queryset(self):
+        """Рецепты списка с фильтрами и сортировкой из запроса."""
+
+        return self.filter_queryset(models.Recipe.objects.all())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_list_queryset()
+        aggregates = {'updated_at': Max('updated_at'), 'count': Count('pk')}
+
+        # Порядок по популярности меняется при пересчете оценок.
+        if request.query_params.get('ordering') in SCORE_ORDERING:
+            aggregates['scored_at'] = Max('score__updated_at')
+
+        state = queryset.aggregate(**aggregates)
+        updated_at = state.pop('updated_at') or EPOCH
+
+        def data():
+            pks = queryset.values_list('pk', flat=True)
+            page = self.paginate_queryset(pks)
+
+            if page is None:
+                return self.get_recipe_representations(list(pks))
+
+            return self.get_paginated_response(
+                self.get_recipe_representations(list(page))
+            ).data
+
+        # Только ETag: удаленный рецепт не меняет наибольшую дату
+        # изменения оставшихся, а число рецептов в ETag входит.
+        etag, _ = self.get_validators(updated_at, *state.values())
+
+        return self.conditional_response(data, etag, None)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = get_lookup_id(
+            self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        )
+        updated_at = models.Recipe.objects.filter(
+            pk=pk
+        ).values_list('updated_at', flat=True).first()
+
+        if updated_at is None:
+            raise Http404
+
+        def data():
+            representations = self.get_recipe_representations([pk])
+
+            if not representations:
+                raise Http404
+
+            return representations[0]
+
+        return self.conditional_response(
+            data, *self.get_validators(updated_at)
+        )
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -158,33 +386,133 @@ class RecipeViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    def __add_recipe(self, recipe, user, serializer):
-        """Базовый метод для добавления рецепта в корзину или избранное."""
+    def __add_recipe(self, recipe, user, model, kind, message, **extra):
+        """Базовый метод для добавления рецепта в корзину или избранное.
+        Уникальность проверяет база данных: повторное добавление,
+        в том числе одновременное, не создает строку и не вызывает
+        IntegrityError."""
 
-        serializer = serializer(data={'user': user.id, 'recipe': recipe.id})
-        serializer.is_valid(raise_exception=True)
-        serializer.save(recipe=recipe, user=user)
+        added = insert_or_ignore(
+            model, user=user.pk, recipe=recipe.pk,
+            added_at=timezone.now(), **extra
+        )
+
+        if not added:
+            return response.Response(
+                {'non_field_errors': [message]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        cache.invalidate_user_ids(user.pk, kind)
         serializer = serializers.ShortRecipeSerializer(recipe)
 
         return response.Response(
             serializer.data, status=status.HTTP_201_CREATED
         )
 
-    def __remove_recipe(self, recipe, related_manager):
-        """Базовый метод для удаления рецепта из корзины или избранного."""
+    def __remove_recipe(self, pk, user, model, kind):
+        """Базовый метод для удаления рецепта из корзины или избранного
+        одним запросом DELETE ... RETURNING."""
 
-        try:
-            instance = related_manager.get(recipe=recipe)
-
-        except models.Recipe.DoesNotExist:
+        if not delete_returning(model, user=user.pk, recipe=pk):
+            get_object_or_404(models.Recipe, pk=pk)
             return response.Response(
                 {"no_recipe": "Вы не доавляли этот рецепт"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        instance.delete()
+
+        cache.invalidate_user_ids(user.pk, kind)
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
+    def __bulk_add_recipes(self, request, model, kind):
+        """Базовый метод для массового добавления рецептов в корзину
+        или избранное одной транзакцией."""
+
+        serializer = serializers.RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+
+        with transaction.atomic():
+            found = set(models.Recipe.objects.filter(
+                pk__in=ids
+            ).values_list('pk', flat=True))
+            present = set(model.objects.filter(
+                user=user, recipe_id__in=found
+            ).values_list('recipe_id', flat=True))
+
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in found - present],
+                ignore_conflicts=True
+            )
+            cache.invalidate_user_ids(user.pk, kind)
+
+        results = [None] * len(ids)
+
+        for num, pk in enumerate(ids):
+            if pk not in found:
+                result = 'not_found'
+            elif pk in present:
+                result = 'already_added'
+            else:
+                result = 'added'
+            results[num] = {'id': pk, 'status': result}
+
+        return response.Response({'results': results})
+
+    def __bulk_remove_recipes(self, request, model, kind):
+        """Базовый метод для массового удаления рецептов из корзины
+        или избранного одним запросом DELETE."""
+
+        serializer = serializers.RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+
+        with transaction.atomic():
+            found = set(models.Recipe.objects.filter(
+                pk__in=ids
+            ).values_list('pk', flat=True))
+            instances = model.objects.filter(user=user, recipe_id__in=found)
+            present = set(instances.values_list('recipe_id', flat=True))
+
+            # Множество id в кэше сбрасывает сигнал post_delete.
+            instances.delete()
+
+        results = [None] * len(ids)
+
+        for num, pk in enumerate(ids):
+            if pk not in found:
+                result = 'not_found'
+            elif pk in present:
+                result = 'removed'
+            else:
+                result = 'not_added'
+            results[num] = {'id': pk, 'status': result}
+
+        return response.Response({'results': results})
+
+    @action(methods=['get'], detail=True)
+    def similar(self, request, pk):
+        """Метод получения рецептов, похожих на рецепт по ингредиентам."""
+
+        pk = get_lookup_id(pk)
+        similar = models.SimilarRecipe.objects.filter(
+            recipe_id=pk, recipe__deleted_at__isnull=True,
+            similar__deleted_at__isnull=True
+        ).select_related('similar').order_by(
+            '-score'
+        )[:settings.SIMILAR_RECIPES_LIMIT]
+
+        if not similar:
+            get_object_or_404(models.Recipe, pk=pk)
+
+        serializer = serializers.ShortRecipeSerializer(
+            [row.similar for row in similar], many=True,
+            context=self.get_serializer_context()
+        )
+        return response.Response(serializer.data)
+
     @action(
         methods=['get'], detail=False,
         permission_classes=[IsAuthenticated]
@@ -192,17 +520,7 @@ class RecipeViewSet(ModelViewSet):
     def download_shopping_cart(self, request):
         """Метод для получения списке рецептов в формате PDF."""
 
-        user = request.user
-
-        shopping_list = user.shoppingcart_related.values(
-            'recipe__ingredients__name',
-            'recipe__ingredients__measurement_unit',
-        ).annotate(
-            ingredient_amount=Sum(
-                'recipe__recipeingredient_related__amount',
-                distinct=True
-            )
-        )
+        shopping_list = request.user.shoppingcart_related.shopping_list()
 
         bytes_file = get_shopping_list(shopping_list)
 
@@ -211,35 +529,181 @@ class RecipeViewSet(ModelViewSet):
         )
 
     @action(
-        methods=['post', 'delete'],
-        detail=True, permission_classes=[IsAuthenticated]
+        methods=['post', 'patch', 'delete'],
+        detail=True, permission_classes=[IsAuthenticated],
+        throttle_classes=RELATION_THROTTLES, throttle_scope='shopping_cart'
     )
     def shopping_cart(self, request, pk):
-        """Метод добавления рецептов в список покупок и удаления из него."""
+        """Метод добавления рецептов в список покупок, изменения
+        числа порций и удаления из него."""
 
-        recipe = get_object_or_404(models.Recipe, id=pk)
+        pk = get_lookup_id(pk)
         user = request.user
 
         if request.method == 'DELETE':
-            return self.__remove_recipe(recipe, user.shoppingcart_related)
+            return self.__remove_recipe(
+                pk, user, models.ShoppingCart, cache.SHOPPING_CART
+            )
+
+        if request.method == 'PATCH':
+            instance = get_object_or_404(
+                user.shoppingcart_related, recipe_id=pk
+            )
+            serializer = serializers.ServingsSerializer(
+                instance, data=request.data
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return response.Response(serializer.data)
+
+        recipe = get_object_or_404(models.Recipe, id=pk)
+        serializer = serializers.ServingsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
         return self.__add_recipe(
-            recipe, user, serializers.ShoppingCartSerializer
+            recipe, user, models.ShoppingCart, cache.SHOPPING_CART,
+            'Рецепт уже в списке покупок.',
+            servings=serializer.validated_data.get('servings', 1)
         )
 
     @action(
         methods=['post', 'delete'], detail=True,
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        throttle_classes=RELATION_THROTTLES, throttle_scope='favorite'
     )
     def favorite(self, request, pk):
         """Метод добавления избранных рецептов и их удаления."""
 
-        recipe = get_object_or_404(models.Recipe, id=pk)
+        pk = get_lookup_id(pk)
         user = request.user
 
         if request.method == 'DELETE':
-            return self.__remove_recipe(recipe, user.favorites_related)
+            return self.__remove_recipe(
+                pk, user, models.Favorites, cache.FAVORITES
+            )
+
+        recipe = get_object_or_404(models.Recipe, id=pk)
 
         return self.__add_recipe(
-            recipe, user, serializers.FavoriteSerializer
+            recipe, user, models.Favorites, cache.FAVORITES,
+            'Рецепт уже в избранном.'
         )
+
+    @action(
+        methods=['post', 'delete'], detail=False,
+        url_path='shopping_cart', url_name='shopping-cart-bulk',
+        permission_classes=[IsAuthenticated],
+        throttle_classes=RELATION_THROTTLES, throttle_scope='shopping_cart'
+    )
+    def shopping_cart_bulk(self, request):
+        """Метод добавления списка рецептов в список покупок
+        и удаления их из него."""
+
+        if request.method == 'DELETE':
+            return self.__bulk_remove_recipes(
+                request, models.ShoppingCart, cache.SHOPPING_CART
+            )
+
+        return self.__bulk_add_recipes(
+            request, models.ShoppingCart, cache.SHOPPING_CART
+        )
+
+    @action(
+        methods=['post', 'delete'], detail=False,
+        url_path='favorite', url_name='favorite-bulk',
+        permission_classes=[IsAuthenticated],
+        throttle_classes=RELATION_THROTTLES, throttle_scope='favorite'
+    )
+    def favorite_bulk(self, request):
+        """Метод добавления списка рецептов в избранное и их удаления."""
+
+        if request.method == 'DELETE':
+            return self.__bulk_remove_recipes(
+                request, models.Favorites, cache.FAVORITES
+            )
+
+        return self.__bulk_add_recipes(
+            request, models.Favorites, cache.FAVORITES
+        )
+
+
+class BatchView(APIView):
+    """Выполняет несколько GET-запросов к API за один HTTP-запрос.
+    Аутентификация выполняется один раз, вложенные запросы передаются
+    в обычные вьюсеты от имени того же пользователя."""
+
+    permission_classes = [AllowAny]
+
+    def build_subrequest(self, request, path, query):
+        environ = request._request.META.copy()
+        environ.update({
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_LENGTH': '0',
+            'wsgi.input': io.BytesIO(),
+        })
+        environ.pop('CONTENT_TYPE', None)
+
+        subrequest = WSGIRequest(environ)
+
+        if request.user.is_authenticated:
+            subrequest._force_auth_user = request.user
+            subrequest._force_auth_token = request.auth
+
+        return subrequest
+
+    def dispatch_subrequest(self, request, url):
+        parsed = urlsplit(url)
+
+        if not parsed.path.startswith('/api/') or parsed.path == request.path:
+            return {'url': url, 'status': status.HTTP_400_BAD_REQUEST,
+                    'body': {'detail': 'Недопустимый адрес запроса.'}}
+
+        try:
+            match = resolve(parsed.path)
+        except Resolver404:
+            return {'url': url, 'status': status.HTTP_404_NOT_FOUND,
+                    'body': {'detail': 'Страница не найдена.'}}
+
+        with track_subrequest(url):
+            subresponse = match.func(
+                self.build_subrequest(request, parsed.path, parsed.query),
+                *match.args, **match.kwargs
+            )
+
+        return {
+            'url': url,
+            'status': subresponse.status_code,
+            'body': getattr(subresponse, 'data', None),
+        }
+
+    def dispatch_in_thread(self, request, url):
+        try:
+            return self.dispatch_subrequest(request, url)
+        finally:
+            connections.close_all()
+
+    def post(self, request):
+        serializer = serializers.BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        urls = [item['url'] for item in serializer.validated_data['requests']]
+
+        if serializer.validated_data['parallel'] and len(urls) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(settings.BATCH_MAX_WORKERS, len(urls))
+            ) as executor:
+                # Потоки выполняют запросы в копии контекста пакетного
+                # запроса, в том числе с его выбором базы для чтения.
+                futures = [
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        self.dispatch_in_thread, request, url
+                    )
+                    for url in urls
+                ]
+                results = [future.result() for future in futures]
+        else:
+            results = [self.dispatch_subrequest(request, url) for url in urls]
+
+        return response.Response(results)
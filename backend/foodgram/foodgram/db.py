@@ -0,0 +1,59 @@
+"""Однозапросные операции записи для таблиц связей с уникальностью.
+
+Проверка существования перед INSERT или DELETE оставляет окно для гонки
+между одновременными запросами. Здесь уникальность проверяет сама база:
+INSERT ... ON CONFLICT DO NOTHING и DELETE ... RETURNING сообщают,
+была ли строка действительно добавлена или удалена.
+"""
+from django.db import connections, router
+
+
+def insert_or_ignore(model, **values):
+    """Добавляет строку, если она не нарушает ограничения уникальности.
+    Возвращает True, если строка добавлена."""
+
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    columns = []
+    params = []
+
+    for name, value in values.items():
+        field = model._meta.get_field(name)
+        columns.append(quote_name(field.column))
+        params.append(field.get_db_prep_save(value, connection))
+
+    sql = (
+        f'INSERT INTO {quote_name(model._meta.db_table)} '
+        f'({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(params))}) '
+        f'ON CONFLICT DO NOTHING '
+        f'RETURNING {quote_name(model._meta.pk.column)}'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone() is not None
+
+
+def delete_returning(model, **filters):
+    """Удаляет строки, совпадающие по значениям полей.
+    Возвращает True, если была удалена хотя бы одна строка."""
+
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    conditions = []
+    params = []
+
+    for name, value in filters.items():
+        field = model._meta.get_field(name)
+        conditions.append(f'{quote_name(field.column)} = %s')
+        params.append(field.get_db_prep_value(value, connection))
+
+    sql = (
+        f'DELETE FROM {quote_name(model._meta.db_table)} '
+        f'WHERE {" AND ".join(conditions)} '
+        f'RETURNING {quote_name(model._meta.pk.column)}'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone() is not None
@@ -0,0 +1,95 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY = 'default'
+
+# Включается на время безопасного запроса к API, см.
+# api.middleware.ReplicaRoutingMiddleware.
+use_replica = ContextVar('use_replica', default=False)
+
+REPLICA_LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+    'END'
+)
+
+_replica_lags = {}
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+
+def measure_replica_lag(alias):
+    """Отставание реплики в секундах, None если реплика недоступна."""
+
+    connection = connections[alias]
+
+    if connection.vendor != 'postgresql':
+        return 0.0
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(REPLICA_LAG_SQL)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+
+    return float(lag or 0)
+
+
+def get_replica_lag(alias):
+    """Отставание реплики, измеряемое не чаще раза
+    в REPLICA_LAG_CHECK_INTERVAL секунд в каждом процессе."""
+
+    now = time.monotonic()
+    lag, checked_at = _replica_lags.get(alias, (None, None))
+
+    if checked_at is None or now - checked_at > (
+        settings.REPLICA_LAG_CHECK_INTERVAL
+    ):
+        lag = measure_replica_lag(alias)
+        _replica_lags[alias] = (lag, now)
+
+    return lag
+
+
+class ReplicaRouter:
+    """Направляет чтение из безопасных запросов к API на реплики,
+    отставание которых не превышает REPLICA_MAX_LAG секунд.
+    Запись, миграции и остальное чтение выполняются на основной базе."""
+
+    def db_for_read(self, model, **hints):
+        # Связанные объекты читаются из той же базы, что и исходный.
+        instance = hints.get('instance')
+
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        if not use_replica.get():
+            return PRIMARY
+
+        replicas = []
+
+        for alias in get_replicas():
+            lag = get_replica_lag(alias)
+            if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+                replicas.append(alias)
+
+        if not replicas:
+            return PRIMARY
+
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -51,10 +52,15 @@ INSTALLED_APPS = [
     'api',
     'users',
     'recipes',
+    'outbox',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.WriteConcurrencyLimitMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.NPlusOneMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -98,6 +104,160 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: хосты через запятую, остальные параметры
+# подключения совпадают с основной базой.
+for num, replica_host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(','))
+):
+    DATABASES[f'replica_{num}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.db_routers.ReplicaRouter']
+
+# Время после изменяющего запроса, в течение которого клиент читает
+# с основной базы.
+REPLICA_STICKY_SECONDS = 10
+
+REPLICA_PIN_CACHE_ALIAS = 'default'
+
+# Реплики с отставанием больше REPLICA_MAX_LAG секунд не используются.
+REPLICA_MAX_LAG = 5
+
+REPLICA_LAG_CHECK_INTERVAL = 5
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+RECIPE_CACHE_ALIAS = 'default'
+
+RECIPE_CACHE_TIMEOUT = 60 * 60
+
+# Множества id избранного, списка покупок и подписок пользователей.
+# При нескольких процессах приложения нужен общий бэкенд кэша.
+RELATIONS_CACHE_ALIAS = 'default'
+
+RELATIONS_CACHE_TIMEOUT = 60 * 60
+
+THROTTLE_CACHE_ALIAS = 'default'
+
+# Лимит одновременных изменяющих запросов к API, ориентир -
+# число доступных соединений с базой данных. Лимит общий для процессов
+# только с общим бэкендом кэша THROTTLE_CACHE_ALIAS. Слот запроса
+# освобождается сам через WRITE_CONCURRENCY_KEY_TIMEOUT секунд.
+WRITE_CONCURRENCY_LIMIT = int(os.getenv('WRITE_CONCURRENCY_LIMIT', default=20))
+
+WRITE_CONCURRENCY_KEY_TIMEOUT = 60
+
+WRITE_RETRY_AFTER = 1
+
+# Максимальное число рецептов в одном запросе массового добавления
+# в избранное или список покупок.
+BULK_RECIPES_LIMIT = 100
+
+# Пакетные запросы /api/batch/: максимальное число вложенных запросов
+# и потоков для их параллельного выполнения.
+BATCH_REQUESTS_LIMIT = 20
+
+BATCH_MAX_WORKERS = 4
+
+# Число хранимых похожих рецептов для каждого рецепта.
+SIMILAR_RECIPES_LIMIT = 10
+
+SIMILAR_RECIPES_BATCH_SIZE = 1000
+
+# Пересчет похожих рецептов из очереди (manage.py
+# refresh_similar_recipes): число кандидатов в соседи, рецептов
+# в одной транзакции и пауза опроса очереди в секундах.
+SIMILAR_RECIPES_CANDIDATES = 500
+
+SIMILAR_RECIPES_REFRESH_BATCH_SIZE = 50
+
+SIMILAR_RECIPES_POLL_INTERVAL = 5
+
+# Популярность рецептов (manage.py refresh_recipe_scores): веса
+# добавлений, окно и период полураспада для сортировки trending.
+RECIPE_SCORE_WEIGHTS = {
+    'FAVORITE_WEIGHT': 1.0,
+    'SHOPPING_CART_WEIGHT': 2.0,
+}
+
+TRENDING_WINDOW_DAYS = 14
+
+TRENDING_HALF_LIFE_HOURS = 48
+
+RECIPE_SCORE_BATCH_SIZE = 1000
+
+# Выгрузка и загрузка каталога (manage.py dump_catalogue,
+# restore_catalogue): строк на чтение курсором и записей в bulk_create.
+CATALOGUE_CHUNK_SIZE = 2000
+
+# Пакетная подготовка списков покупок (manage.py
+# generate_shopping_lists): каталог в media и число пользователей
+# в пачке, передаваемой воркеру.
+SHOPPING_LISTS_DIR = 'shopping_lists'
+
+SHOPPING_LIST_BATCH_SIZE = 200
+
+# Изображение рецепта: наибольший размер файла в байтах (в base64
+# и в multipart) и наибольшая сторона в пикселях.
+RECIPE_IMAGE_MAX_SIZE = 5 * 2 ** 20
+
+RECIPE_IMAGE_MAX_DIMENSION = 4096
+
+# Очистка удаленных пользователей и рецептов (manage.py purge_deleted):
+# строк связей в одной транзакции и секунд между проверками.
+PURGE_BATCH_SIZE = 1000
+
+PURGE_POLL_INTERVAL = 60
+
+# Подсказки ингредиентов (api.suggestions): минимальная длина выдачи,
+# до которой совпадения по префиксу дополняются исправленными
+# опечатками, допустимое число правок и срок жизни индекса в процессе.
+INGREDIENT_SUGGESTIONS_LIMIT = 10
+
+INGREDIENT_SEARCH_MAX_DISTANCE = 2
+
+INGREDIENT_INDEX_TTL = 600
+
+INGREDIENT_INDEX_CACHE_ALIAS = 'default'
+
+# Профилирование запросов (api.middleware.ProfilingMiddleware): доля
+# профилируемых запросов, каталог и размер кольцевого буфера профилей,
+# заголовок с подписанным токеном и срок действия токена в секундах.
+# Каталог по умолчанию вне исходников: профили не попадают в коммиты
+# и образы.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE') or 0)
+
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR',
+    default=Path(tempfile.gettempdir()) / 'foodgram-profiles'
+)
+
+PROFILING_MAX_FILES = 200
+
+PROFILING_HEADER = 'HTTP_X_PROFILE'
+
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# Поиск N+1 запросов (api.middleware.NPlusOneMiddleware): 'warn' -
+# предупреждение при разработке, 'raise' - исключение (в тестах
+# включается api.nplusone.NPlusOneTestMixin), 'off' - отключен. Запрос
+# одной формы, повторенный N_PLUS_ONE_THRESHOLD раз, считается N+1.
+N_PLUS_ONE_DETECTION = os.getenv('N_PLUS_ONE_DETECTION') or 'off'
+
+N_PLUS_ONE_THRESHOLD = 3
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -132,6 +292,14 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageNumberLimitPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_RATES': {
+        'favorite_user': '60/min',
+        'favorite_ip': '120/min',
+        'shopping_cart_user': '60/min',
+        'shopping_cart_ip': '120/min',
+        'subscribe_user': '30/min',
+        'subscribe_ip': '60/min',
+    },
 }
 
 DJOSER = {
@@ -158,10 +326,44 @@ DJOSER = {
     'HIDE_USERS': False,
 }
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма из запросов только записываются в очередь (приложение outbox),
+# отправляет их manage.py drain_outbox через OUTBOX_EMAIL_BACKEND:
+# в продакшене SMTP, локально и в тестах - файлы в EMAIL_FILE_PATH.
+EMAIL_BACKEND = 'outbox.backends.OutboxEmailBackend'
+
+# Пустые значения в .env равносильны отсутствующим.
+OUTBOX_EMAIL_BACKEND = (
+    os.getenv('OUTBOX_EMAIL_BACKEND')
+    or 'django.core.mail.backends.filebased.EmailBackend'
+)
 
 EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
 
+EMAIL_HOST = os.getenv('EMAIL_HOST') or 'localhost'
+
+EMAIL_PORT = int(os.getenv('EMAIL_PORT') or 25)
+
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', default='')
+
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', default='')
+
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', default='') == 'True'
+
+EMAIL_TIMEOUT = 30
+
+# Писем в пачке, секунд между опросами пустой очереди, число попыток
+# и задержка перед повтором: OUTBOX_RETRY_DELAY, удваивается после
+# каждой неудачи до OUTBOX_MAX_RETRY_DELAY.
+OUTBOX_BATCH_SIZE = 100
+
+OUTBOX_POLL_INTERVAL = 5
+
+OUTBOX_MAX_ATTEMPTS = 8
+
+OUTBOX_RETRY_DELAY = 60
+
+OUTBOX_MAX_RETRY_DELAY = 6 * 60 * 60
+
 POST_EMAIL = 'from@example.com'
 
 
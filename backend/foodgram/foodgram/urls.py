@@ -13,10 +13,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from api.admin import profiling_urls
 from django.contrib import admin
 from django.urls import include, path
 
 urlpatterns = [
+    path('admin/profiles/', include(profiling_urls)),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls'))
 ]
@@ -0,0 +1,72 @@
+"""Прогрев процесса перед обработкой запросов.
+
+При preload_app gunicorn вызывает warm_up в мастер-процессе до fork,
+воркеры получают уже загруженные модули, шрифт и построенные
+структуры Django и DRF вместо того, чтобы собирать их на первом запросе.
+Мастер к базе не обращается. Данные из базы каждый воркер загружает
+в warm_up_worker после запуска; ошибка базы только записывается
+в лог, данные загрузятся при первом обращении.
+"""
+import logging
+
+from django.apps import apps
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_fonts():
+    from api.shopping_list_pdf import register_font
+    from reportlab.pdfgen import canvas  # noqa: F401
+
+    register_font()
+
+
+def warm_models():
+    """Заполняет кэши _meta моделей, в том числе обратные связи
+    тегов и ингредиентов, и строит поля сериализаторов."""
+
+    from api import serializers
+
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+    for serializer in (
+        serializers.TagSerializer,
+        serializers.IngredientSerializer,
+        serializers.ReadRecipeSerializer,
+        serializers.WriteRecipeSerializer,
+        serializers.ShortRecipeSerializer,
+        serializers.UserSerializer,
+        serializers.UserSubscriptionSerializer,
+    ):
+        serializer().fields
+
+
+def warm_ingredient_index():
+    from api.suggestions import get_ingredient_index
+
+    get_ingredient_index()
+
+
+def warm_urls():
+    # Разбор urlconf импортирует все вьюсеты и компилирует шаблоны адресов.
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+
+
+def warm_up():
+    warm_urls()
+    warm_models()
+    warm_fonts()
+
+
+def warm_up_worker():
+    try:
+        warm_ingredient_index()
+    except DatabaseError as error:
+        logger.warning('Ingredient index warm-up skipped: %s', error)
+    finally:
+        connections.close_all()
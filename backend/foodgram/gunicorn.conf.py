@@ -0,0 +1,17 @@
+# Приложение загружается в мастер-процессе до fork: воркеры стартуют
+# с уже импортированными модулями и прогретыми структурами.
+preload_app = True
+
+
+def when_ready(server):
+    from foodgram.warmup import warm_up
+
+    warm_up()
+
+
+def post_worker_init(worker):
+    # Данные из базы загружаются в каждом воркере: при старте мастера
+    # база может быть еще недоступна или не мигрирована.
+    from foodgram.warmup import warm_up_worker
+
+    warm_up_worker()
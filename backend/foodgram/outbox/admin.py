@@ -0,0 +1,30 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+
+@admin.action(description='Отправить повторно')
+def retry_messages(modeladmin, request, queryset):
+    queryset.update(
+        status=OutboxMessage.PENDING, attempts=0,
+        next_attempt_at=timezone.now()
+    )
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = [
+        'pk', 'subject', 'recipients', 'status', 'attempts',
+        'next_attempt_at', 'created_at'
+    ]
+    list_filter = ['status']
+    exclude = ['message']
+    readonly_fields = [
+        'subject', 'from_email', 'recipients', 'status', 'attempts',
+        'next_attempt_at', 'last_error', 'created_at'
+    ]
+    actions = [retry_messages]
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
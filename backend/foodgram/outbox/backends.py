@@ -0,0 +1,23 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .models import OutboxMessage
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Записывает письма в очередь вместо отправки: запрос не ждет
+    почтовый сервер, письмо сохраняется в той же транзакции, что
+    и данные. Очередь разбирает manage.py drain_outbox."""
+
+    def send_messages(self, email_messages):
+        rows = [
+            OutboxMessage(
+                subject=str(message.subject)[:255],
+                from_email=message.from_email,
+                recipients=message.recipients(),
+                message=message.message().as_bytes(),
+            )
+            for message in email_messages if message.recipients()
+        ]
+        OutboxMessage.objects.bulk_create(rows)
+
+        return len(rows)
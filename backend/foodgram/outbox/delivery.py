@@ -0,0 +1,108 @@
+"""Отправка писем из очереди.
+
+Письма выбираются пачками по времени следующей попытки, строки
+блокируются с пропуском занятых, поэтому воркеров может быть несколько.
+Все пачки отправляются через одно соединение OUTBOX_EMAIL_BACKEND,
+которое закрывается, когда очередь пуста. Отправленные письма
+удаляются, неудачные откладываются с экспоненциально растущей
+задержкой и после OUTBOX_MAX_ATTEMPTS попыток помечаются как
+неотправленные.
+"""
+import random
+from datetime import timedelta
+from email import message_from_bytes
+from email.message import Message
+from typing import Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.message import MIMEMixin
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+
+class StoredMessage(MIMEMixin, Message):
+    """Разобранное сохраненное сообщение с сериализацией как у писем
+    Django (as_bytes с linesep для SMTP)."""
+
+
+class StoredEmail(EmailMessage):
+    """Письмо из очереди в виде, который принимают почтовые бэкенды."""
+
+    def __init__(self, row):
+        super().__init__(from_email=row.from_email)
+        self.row = row
+
+    def recipients(self):
+        return self.row.recipients
+
+    def message(self):
+        return message_from_bytes(bytes(self.row.message), StoredMessage)
+
+
+def get_outbox_connection():
+    return get_connection(settings.OUTBOX_EMAIL_BACKEND, fail_silently=False)
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    delay = min(
+        settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.OUTBOX_MAX_RETRY_DELAY
+    )
+    # Случайная часть разводит повторы писем, упавших одновременно.
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def drain_batch(connection, batch_size: int) -> Tuple[int, int]:
+    """Отправляет пачку писем, время попытки которых наступило.
+    Возвращает число отправленных и неудачных попыток.
+    Ошибка открытия соединения прерывает пачку и передается дальше,
+    оставшиеся письма остаются в очереди без изменений."""
+
+    now = timezone.now()
+
+    with transaction.atomic():
+        rows = list(OutboxMessage.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            status=OutboxMessage.PENDING, next_attempt_at__lte=now
+        ).order_by('next_attempt_at')[:batch_size])
+        sent = []
+        failed = []
+        open_error = None
+
+        for row in rows:
+            # Соединение уже открыто или открывается заново после ошибки.
+            try:
+                connection.open()
+            except OSError as error:
+                open_error = error
+                break
+            try:
+                connection.send_messages([StoredEmail(row)])
+            except Exception as error:
+                # Ошибка одного письма (адрес, отказ сервера) не
+                # останавливает очередь.
+                connection.close()
+                row.attempts += 1
+                row.last_error = f'{type(error).__name__}: {error}'
+                if row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    row.status = OutboxMessage.FAILED
+                else:
+                    row.next_attempt_at = now + get_retry_delay(row.attempts)
+                failed.append(row)
+            else:
+                sent.append(row.pk)
+
+        OutboxMessage.objects.filter(pk__in=sent).delete()
+        OutboxMessage.objects.bulk_update(
+            failed, ['attempts', 'last_error', 'status', 'next_attempt_at']
+        )
+
+    # Результат уже отправленных писем сохранен, повторно они не уйдут.
+    if open_error is not None:
+        raise open_error
+
+    return len(sent), len(failed)
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from outbox.delivery import drain_batch, get_outbox_connection
+
+
+class Command(BaseCommand):
+    help = (
+        'sends queued emails in batches over one reused connection, '
+        'retrying failures with backoff'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='exit when no messages are due instead of polling'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+            help='messages locked and sent per transaction'
+        )
+
+    def handle(self, *args, **kwargs):
+        connection = get_outbox_connection()
+        total_sent = total_failed = 0
+
+        try:
+            while True:
+                try:
+                    sent, failed = drain_batch(
+                        connection, kwargs['batch_size']
+                    )
+                except OSError as error:
+                    # Почтовый сервер недоступен: письма остаются
+                    # в очереди до следующего опроса.
+                    self.stderr.write(f'Connection failed: {error}')
+                    sent = failed = 0
+
+                total_sent += sent
+                total_failed += failed
+
+                if sent or failed:
+                    self.stdout.write(f'{sent} sent, {failed} failed')
+
+                if sent + failed == kwargs['batch_size']:
+                    continue
+
+                # Очередь пуста: соединение не держится открытым
+                # во время простоя.
+                connection.close()
+
+                if kwargs['once']:
+                    break
+
+                time.sleep(settings.OUTBOX_POLL_INTERVAL)
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_sent} emails sent, {total_failed} attempts failed'
+        ))
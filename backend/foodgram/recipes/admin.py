@@ -1,8 +1,151 @@
+from math import ceil
+
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.forms.models import BaseInlineFormSet
+from django.http import QueryDict
+from django.urls import NoReverseMatch, reverse
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
+from foodgram.soft_delete import SoftDeleteAdminMixin
 
 from . import models
 
 
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех возможных значений."""
+
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'query_parts': (
+                (key, value)
+                for key, value in changelist.get_filters_params().items()
+                if key != self.parameter_name
+            ),
+        }
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору (username или email)'
+    parameter_name = 'author'
+
+    def queryset(self, request, queryset):
+        value = self.value()
+
+        if value:
+            return queryset.filter(
+                Q(author__username=value) | Q(author__email=value)
+            )
+
+        return queryset
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Формсет, загружающий только одну страницу связанных объектов.
+    Для шаблона инлайна считает общее число объектов и строит ссылки
+    на соседние страницы и на список объектов в админке."""
+
+    per_page = 20
+    page = 1
+    page_param = 'page'
+    query = QueryDict()
+
+    @cached_property
+    def total(self):
+        return self.queryset.count()
+
+    @cached_property
+    def page_count(self):
+        return max(ceil(self.total / self.per_page), 1)
+
+    @cached_property
+    def current_page(self):
+        # Страница за последней (после удаления объектов) - последняя.
+        return min(self.page, self.page_count)
+
+    @property
+    def first_shown(self):
+        return min((self.current_page - 1) * self.per_page + 1, self.total)
+
+    @property
+    def last_shown(self):
+        return min(self.current_page * self.per_page, self.total)
+
+    def get_page_url(self, page):
+        query = self.query.copy()
+        query[self.page_param] = page
+        return f'?{query.urlencode()}'
+
+    @property
+    def previous_page_url(self):
+        if self.current_page > 1:
+            return self.get_page_url(self.current_page - 1)
+        return None
+
+    @property
+    def next_page_url(self):
+        if self.current_page < self.page_count:
+            return self.get_page_url(self.current_page + 1)
+        return None
+
+    @property
+    def changelist_url(self):
+        """Список связанных объектов в админке, отфильтрованный
+        по текущему объекту."""
+
+        opts = self.model._meta
+
+        try:
+            url = reverse(
+                f'admin:{opts.app_label}_{opts.model_name}_changelist'
+            )
+        except NoReverseMatch:
+            return None
+
+        return f'{url}?{self.fk.name}__id__exact={self.instance.pk}'
+
+    def get_queryset(self):
+        if not hasattr(self, '_page_queryset'):
+            start = (self.current_page - 1) * self.per_page
+            self._page_queryset = super().get_queryset()[
+                start:start + self.per_page
+            ]
+        return self._page_queryset
+
+
+class PaginatedInline(admin.TabularInline):
+    """Инлайн с постраничным выводом. Номер страницы передается
+    в параметре <имя модели>_page строки запроса, под таблицей
+    выводятся число объектов и ссылки на страницы."""
+
+    formset = PaginatedInlineFormSet
+    template = 'admin/edit_inline/paginated_tabular.html'
+    per_page = 20
+    extra = 0
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_param = f'{self.opts.model_name}_page'
+        formset.query = request.GET
+
+        try:
+            page = int(request.GET.get(formset.page_param, 1))
+        except ValueError:
+            page = 1
+
+        formset.page = max(page, 1)
+        return formset
+
+
 class TagAdmin(admin.ModelAdmin):
     model = models.Tag
     list_display = ['pk', 'name', 'color', 'slug']
@@ -16,6 +159,7 @@ class IngredientAdmin(admin.ModelAdmin):
 
 class IngredientInline(admin.TabularInline):
     model = models.RecipeIngredient
+    autocomplete_fields = ['ingredient']
     extra = 1
 
 
@@ -24,17 +168,17 @@ class TagInline(admin.TabularInline):
     extra = 1
 
 
-class ShoppingCartInlite(admin.TabularInline):
+class ShoppingCartInlite(PaginatedInline):
     model = models.ShoppingCart
-    extra = 1
+    autocomplete_fields = ['user']
 
 
-class FavoritesInlite(admin.TabularInline):
+class FavoritesInlite(PaginatedInline):
     model = models.Favorites
-    extra = 1
+    autocomplete_fields = ['user']
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     model = models.Recipe
     inlines = (
         IngredientInline, TagInline,
@@ -42,19 +186,49 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     list_display = ['id', 'author',
                     'name', 'image',
-                    'text', 'cooking_time'
+                    'short_text', 'cooking_time',
+                    'favorites_count'
                     ]
-    list_filter = ['author', 'name', 'tags']
+    list_filter = [AuthorFilter, 'tags']
+    list_select_related = ['author']
+    search_fields = ['name']
+    autocomplete_fields = ['author']
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Коррелированный подзапрос считается только для строк страницы,
+        # в отличие от GROUP BY по всей таблице избранного.
+        favorites_count = models.Favorites.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(count=Count('pk')).values('count')
+
+        return super().get_queryset(request).annotate(
+            favorites_count=Subquery(favorites_count)
+        )
+
+    @admin.display(description='Описание')
+    def short_text(self, obj):
+        return Truncator(obj.text).chars(100)
+
+    @admin.display(description='В избранном', ordering='favorites_count')
+    def favorites_count(self, obj):
+        return obj.favorites_count or 0
 
 
 class ShoppongCartAdmin(admin.ModelAdmin):
     model = models.ShoppingCart
     list_display = ['id', 'user', 'recipe']
+    list_select_related = ['user', 'recipe']
+    autocomplete_fields = ['user', 'recipe']
+    show_full_result_count = False
 
 
 class FavoritesAdmin(admin.ModelAdmin):
     model = models.Favorites
     list_display = ['id', 'user', 'recipe']
+    list_select_related = ['user', 'recipe']
+    autocomplete_fields = ['user', 'recipe']
+    show_full_result_count = False
 
 
 admin.site.register(models.Tag, TagAdmin)
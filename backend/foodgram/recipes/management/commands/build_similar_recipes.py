@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from recipes.similarity import rebuild_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'rebuilds the similar recipes index from recipe ingredients'
+
+    def handle(self, *args, **kwargs):
+        total = rebuild_similar_recipes()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{total} similar recipe pairs saved')
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from recipes.scores import refresh_recipe_scores
+
+
+class Command(BaseCommand):
+    help = 'recalculates popularity and trending scores of recipes'
+
+    def handle(self, *args, **kwargs):
+        total = refresh_recipe_scores()
+
+        self.stdout.write(self.style.SUCCESS(f'{total} recipe scores saved'))
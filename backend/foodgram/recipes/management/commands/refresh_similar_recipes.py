@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.similarity import refresh_queued_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'refreshes similar recipes of recipes queued after changes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='exit when the queue is empty instead of polling'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.SIMILAR_RECIPES_REFRESH_BATCH_SIZE,
+            help='recipes refreshed per transaction'
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            count = refresh_queued_similar_recipes(kwargs['batch_size'])
+
+            if count:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{count} recipes refreshed'
+                ))
+                continue
+
+            if kwargs['once']:
+                break
+
+            time.sleep(settings.SIMILAR_RECIPES_POLL_INTERVAL)
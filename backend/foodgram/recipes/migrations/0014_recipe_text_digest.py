@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-19 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='text_digest',
+            field=models.CharField(editable=False, max_length=64, null=True, verbose_name='Хэш описания'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+import hashlib
+
+from django.db import migrations, transaction
+
+# Миграция не атомарна: каждая пачка рецептов обновляется в своей
+# транзакции, блокировки на таблице не держатся до конца заполнения.
+BATCH_SIZE = 1000
+
+# В PostgreSQL хэш считается в базе, тексты не передаются в Python.
+POSTGRESQL_BACKFILL_SQL = (
+    "UPDATE recipes_recipe "
+    "SET text_digest = encode(sha256(convert_to(text, 'UTF8')), 'hex') "
+    "WHERE id IN ({})"
+)
+
+
+def backfill_text_digest(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    db_alias = schema_editor.connection.alias
+    recipes = Recipe.objects.using(db_alias)
+
+    # Рецепты, добавленные во время заполнения, попадают в следующий
+    # проход: цикл завершается, когда пустых значений не остается.
+    while True:
+        pks = list(recipes.filter(
+            text_digest__isnull=True
+        ).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+
+        if not pks:
+            break
+
+        with transaction.atomic(using=db_alias):
+            if schema_editor.connection.vendor == 'postgresql':
+                schema_editor.execute(
+                    POSTGRESQL_BACKFILL_SQL.format(
+                        ', '.join(['%s'] * len(pks))
+                    ),
+                    pks
+                )
+                continue
+
+            batch = list(recipes.filter(pk__in=pks).only('pk', 'text'))
+            for recipe in batch:
+                recipe.text_digest = hashlib.sha256(
+                    recipe.text.encode()
+                ).hexdigest()
+            recipes.bulk_update(batch, ['text_digest'])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0014_recipe_text_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_text_digest, migrations.RunPython.noop, elidable=True
+        ),
+    ]
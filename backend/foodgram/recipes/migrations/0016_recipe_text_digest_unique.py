@@ -0,0 +1,26 @@
+# Generated by Django 4.0.5 on 2026-10-19 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_backfill_recipe_text_digest'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='recipe',
+            name='unique_name_text_recipe',
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='text_digest',
+            field=models.CharField(editable=False, max_length=64, verbose_name='Хэш описания'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipe',
+            constraint=models.UniqueConstraint(fields=('name', 'text_digest'), name='unique_name_text_digest_recipe'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+from django.db import migrations, models, transaction
+from django.db.models import F
+
+# Значение для существующих строк: постоянное значение по умолчанию
+# добавляется без перезаписи таблицы, затем заменяется датой публикации.
+UNSET = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+BATCH_SIZE = 1000
+
+
+def copy_pub_date(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    db_alias = schema_editor.connection.alias
+    recipes = Recipe._base_manager.using(db_alias)
+
+    while True:
+        pks = list(recipes.filter(
+            updated_at=UNSET
+        ).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+
+        if not pks:
+            break
+
+        with transaction.atomic(using=db_alias):
+            recipes.filter(pk__in=pks).update(updated_at=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0017_recipe_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(
+                auto_now=True, default=UNSET, verbose_name='Дата изменения'
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            copy_pub_date, migrations.RunPython.noop, elidable=True
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(
+                fields=['-updated_at'], name='recipe_updated_at_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.5 on 2026-10-19 19:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipeRefresh',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='recipes.recipe')),
+                ('queued_at', models.DateTimeField(verbose_name='Дата постановки')),
+            ],
+            options={
+                'verbose_name': 'Пересчет похожих рецептов',
+                'verbose_name_plural': 'Пересчеты похожих рецептов',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, transaction
+
+# Миграция не атомарна: каждая пачка строк добавляется в своей
+# транзакции.
+BATCH_SIZE = 1000
+
+
+def create_missing_scores(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    db_alias = schema_editor.connection.alias
+
+    # Рецепты без строки популярности не попадают в сортировку по ней.
+    while True:
+        pks = list(Recipe.objects.using(db_alias).filter(
+            score__isnull=True
+        ).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+
+        if not pks:
+            break
+
+        with transaction.atomic(using=db_alias):
+            RecipeScore.objects.using(db_alias).bulk_create(
+                [RecipeScore(recipe_id=pk) for pk in pks],
+                ignore_conflicts=True
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0020_shoppingcart_servings_max'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_missing_scores, migrations.RunPython.noop, elidable=True
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Поиск ингредиентов выполняется по индексу в памяти процесса
+# (api.suggestions), индекс по UPPER(name) из 0009 не используется
+# и только замедляет запись.
+INGREDIENT_NAME_INDEX = 'ingredient_name_upper_like_idx'
+
+
+def drop_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}')
+
+
+def create_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX} '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0021_backfill_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            drop_ingredient_name_index, create_ingredient_name_index
+        ),
+    ]
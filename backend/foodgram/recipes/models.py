@@ -1,9 +1,23 @@
+import hashlib
 from re import fullmatch
 
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Cast
+from foodgram.soft_delete import SoftDeleteModel
 from users.models import User
 
+from .storage import ContentAddressedStorage
+
+
+def get_text_digest(text):
+    """SHA-256 описания рецепта: уникальность проверяется по нему,
+    а не по индексу на полном тексте."""
+
+    return hashlib.sha256(text.encode()).hexdigest()
+
 
 class Tag(models.Model):
 
@@ -58,7 +72,7 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(SoftDeleteModel):
 
     tags = models.ManyToManyField(
         Tag, through='RecipeTag',
@@ -67,6 +81,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
         blank=False, null=False,
         verbose_name='Изображение'
     )
@@ -97,21 +112,62 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    text_digest = models.CharField(
+        max_length=64, editable=False,
+        verbose_name='Хэш описания'
+    )
 
     class Meta:
         verbose_name = ('Рецепт')
         verbose_name_plural = ('Рецепты')
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-updated_at'], name='recipe_updated_at_idx'
+            ),
+            models.Index(
+                fields=['deleted_at'], name='recipe_deleted_at_idx',
+                condition=Q(deleted_at__isnull=False)
+            ),
+        ]
         constraints = [
+            # Удаленный рецепт не мешает добавить такой же до очистки.
             models.UniqueConstraint(
-                fields=['name', 'text'],
-                name='unique_name_text_recipe'
+                fields=['name', 'text_digest'],
+                condition=Q(deleted_at__isnull=True),
+                name='unique_name_text_digest_recipe'
             )
         ]
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if Recipe.objects.filter(
+            name=self.name, text_digest=get_text_digest(self.text)
+        ).exclude(pk=self.pk).exists():
+            raise ValidationError(
+                'Рецепт с таким названием и текстом уже существует.'
+            )
+
+    def save(self, *args, **kwargs):
+        self.text_digest = get_text_digest(self.text)
+        update_fields = kwargs.get('update_fields')
+
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'text_digest'}
+
+        super().save(*args, **kwargs)
+
 
 class BaseRecipeLinkTable(models.Model):
     """Base class containing recipe field with description."""
@@ -135,6 +191,11 @@ class BaseRecipeUser(BaseRecipeLinkTable):
         on_delete=models.CASCADE,
         related_name="%(class)s_related"
     )
+    added_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         abstract = True
@@ -178,8 +239,44 @@ class RecipeIngredient(BaseRecipeLinkTable):
         return f'{self.ingredient} {self.amount}'
 
 
+class ShoppingCartQuerySet(models.QuerySet):
+
+    def shopping_list(self, *fields):
+        """Сводный список ингредиентов рецептов из списка покупок.
+        Количества умножаются на число порций, суммируются по ингредиенту
+        и единице измерения и сортируются по названию одним запросом.
+        Дополнительные поля fields (например, user_id) входят в
+        группировку и сортировку перед названием."""
+
+        return self.values(
+            *fields,
+            name=F('recipe__recipeingredient_related__ingredient__name'),
+            measurement_unit=F(
+                'recipe__recipeingredient_related__ingredient__'
+                'measurement_unit'
+            ),
+        ).filter(
+            name__isnull=False, recipe__deleted_at__isnull=True
+        ).annotate(
+            # Произведение двух smallint в PostgreSQL остается smallint
+            # и переполняется после 32767.
+            amount=Sum(Cast(
+                'recipe__recipeingredient_related__amount',
+                models.IntegerField()
+            ) * F('servings'))
+        ).order_by(*fields, 'name')
+
+
 class ShoppingCart(BaseRecipeUser):
 
+    servings = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1), MaxValueValidator(100)],
+        verbose_name='Количество порций'
+    )
+
+    objects = ShoppingCartQuerySet.as_manager()
+
     class Meta:
         verbose_name = ('Список покупок')
         verbose_name_plural = ('Списки покупок')
@@ -202,3 +299,88 @@ class Favorites(BaseRecipeUser):
                 name='unique_user_recipe_favorites'
             )
         ]
+
+
+class RecipeScore(models.Model):
+    """Популярность рецепта, пересчитываемая периодически командой
+    refresh_recipe_scores, см. recipes.scores."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score'
+    )
+    popularity = models.FloatField(default=0, verbose_name='Популярность')
+    trending = models.FloatField(default=0, verbose_name='Тренд')
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата пересчета'
+    )
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popularity'], name='recipe_score_popularity_idx'
+            ),
+            models.Index(
+                fields=['-trending'], name='recipe_score_trending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.popularity} {self.trending}'
+
+
+class SimilarRecipe(models.Model):
+    """Предрассчитанные похожие рецепты: коэффициент Жаккара
+    по множествам ингредиентов, см. recipes.similarity."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'], name='similar_recipe_score_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similar'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.similar_id} {self.score:.2f}'
+
+
+class SimilarRecipeRefresh(models.Model):
+    """Очередь пересчета похожих рецептов после изменения ингредиентов,
+    обрабатывается manage.py refresh_similar_recipes."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+'
+    )
+    queued_at = models.DateTimeField(verbose_name='Дата постановки')
+
+    class Meta:
+        verbose_name = 'Пересчет похожих рецептов'
+        verbose_name_plural = 'Пересчеты похожих рецептов'
@@ -0,0 +1,88 @@
+"""Периодический пересчет популярности рецептов.
+
+popularity - взвешенное число добавлений в избранное и список покупок
+за все время, trending - то же число за последние TRENDING_WINDOW_DAYS
+дней с экспоненциальным затуханием по возрасту добавления
+(вес уменьшается вдвое каждые TRENDING_HALF_LIFE_HOURS часов).
+Добавления агрегируются в базе по рецепту и часу, затухание
+применяется к почасовым суммам.
+
+Строка RecipeScore есть у каждого рецепта (нулевая у рецептов без
+добавлений): сортировка по популярности соединяет таблицы INNER JOIN
+и читает рецепты по индексу популярности.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Favorites, Recipe, RecipeScore, ShoppingCart
+
+SCORE_SOURCES = (
+    (Favorites, 'FAVORITE_WEIGHT'),
+    (ShoppingCart, 'SHOPPING_CART_WEIGHT'),
+)
+
+
+def create_missing_scores():
+    """Создает нулевые строки популярности рецептам без них."""
+
+    batch_size = settings.RECIPE_SCORE_BATCH_SIZE
+    pks = Recipe._base_manager.filter(
+        score__isnull=True
+    ).values_list('pk', flat=True).iterator(chunk_size=batch_size)
+
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=pk) for pk in pks),
+        batch_size=batch_size, ignore_conflicts=True
+    )
+
+
+def refresh_recipe_scores():
+    """Пересчитывает таблицу RecipeScore. Возвращает число рецептов."""
+
+    now = timezone.now()
+    window_start = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    half_life = timedelta(hours=settings.TRENDING_HALF_LIFE_HOURS)
+    popularity = defaultdict(float)
+    trending = defaultdict(float)
+
+    for model, weight_name in SCORE_SOURCES:
+        weight = settings.RECIPE_SCORE_WEIGHTS[weight_name]
+
+        for recipe_id, count in model.objects.values(
+            'recipe_id'
+        ).annotate(count=Count('pk')).values_list('recipe_id', 'count'):
+            popularity[recipe_id] += weight * count
+
+        for recipe_id, hour, count in model.objects.filter(
+            added_at__gte=window_start
+        ).annotate(hour=TruncHour('added_at')).values(
+            'recipe_id', 'hour'
+        ).annotate(count=Count('pk')).values_list(
+            'recipe_id', 'hour', 'count'
+        ):
+            decay = 0.5 ** ((now - hour) / half_life)
+            trending[recipe_id] += weight * count * decay
+
+    bulk_list = [
+        RecipeScore(
+            recipe_id=recipe_id,
+            popularity=score,
+            trending=trending.get(recipe_id, 0)
+        )
+        for recipe_id, score in popularity.items()
+    ]
+
+    with transaction.atomic():
+        RecipeScore.objects.all().delete()
+        RecipeScore.objects.bulk_create(
+            bulk_list, batch_size=settings.RECIPE_SCORE_BATCH_SIZE
+        )
+        create_missing_scores()
+
+    return len(bulk_list)
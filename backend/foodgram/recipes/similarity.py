@@ -0,0 +1,201 @@
+"""Индекс похожих рецептов по коэффициенту Жаккара множеств ингредиентов.
+
+Матрица рецепт-ингредиент разрежена, поэтому пересечения считаются
+по инвертированному индексу ингредиент -> рецепты, а не попарно.
+Для каждого рецепта хранится не более SIMILAR_RECIPES_LIMIT соседей.
+
+После изменения рецепта он ставится в очередь, соседей пересчитывает
+manage.py refresh_similar_recipes вне запроса. Кандидаты ограничены
+SIMILAR_RECIPES_CANDIDATES рецептами с наибольшим числом общих
+ингредиентов: общий ингредиент вроде соли не делает соседом весь
+каталог.
+"""
+import heapq
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from foodgram.db import insert_or_ignore
+
+from .models import RecipeIngredient, SimilarRecipe, SimilarRecipeRefresh
+
+
+def jaccard(shared, size, other_size):
+    return shared / (size + other_size - shared)
+
+
+def compute_scores(recipe_id):
+    """Сходство рецепта с рецептами, имеющими больше всего общих
+    ингредиентов."""
+
+    ingredient_ids = RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values('ingredient_id')
+    size = len(set(ingredient_ids.values_list('ingredient_id', flat=True)))
+
+    if not size:
+        return {}
+
+    shared = dict(RecipeIngredient.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).exclude(
+        recipe_id=recipe_id
+    ).values('recipe_id').annotate(
+        shared=Count('ingredient_id', distinct=True)
+    ).order_by('-shared').values_list(
+        'recipe_id', 'shared'
+    )[:settings.SIMILAR_RECIPES_CANDIDATES])
+
+    sizes = dict(RecipeIngredient.objects.filter(
+        recipe_id__in=shared
+    ).values('recipe_id').annotate(
+        size=Count('ingredient_id', distinct=True)
+    ).values_list('recipe_id', 'size'))
+
+    return {
+        other_id: jaccard(count, size, sizes[other_id])
+        for other_id, count in shared.items()
+    }
+
+
+def queue_similar_recipes(recipe_id):
+    """Ставит рецепт в очередь пересчета похожих рецептов."""
+
+    insert_or_ignore(
+        SimilarRecipeRefresh, recipe=recipe_id, queued_at=timezone.now()
+    )
+
+
+def refresh_similar_recipes(recipe_id):
+    """Пересчитывает соседей рецепта и обновляет его место в списках
+    соседей других рецептов, оставляя в них лучшие
+    SIMILAR_RECIPES_LIMIT."""
+
+    limit = settings.SIMILAR_RECIPES_LIMIT
+    scores = compute_scores(recipe_id)
+    top = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+
+    stats = {
+        row['recipe_id']: (row['count'], row['lowest'])
+        for row in SimilarRecipe.objects.filter(
+            recipe_id__in=scores
+        ).exclude(
+            similar_id=recipe_id
+        ).values('recipe_id').annotate(
+            count=Count('pk'), lowest=Min('score')
+        )
+    }
+
+    bulk_list = [
+        SimilarRecipe(recipe_id=recipe_id, similar_id=other_id, score=score)
+        for other_id, score in top
+    ]
+
+    overflow = []
+
+    for other_id, score in scores.items():
+        count, lowest = stats.get(other_id, (0, 0))
+        if count < limit or score > lowest:
+            bulk_list.append(SimilarRecipe(
+                recipe_id=other_id, similar_id=recipe_id, score=score
+            ))
+            if count >= limit:
+                overflow.append(other_id)
+
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+        SimilarRecipe.objects.bulk_create(
+            bulk_list, batch_size=settings.SIMILAR_RECIPES_BATCH_SIZE
+        )
+
+        # Списки, в которые рецепт вошел сверх лимита, обрезаются.
+        for other_id in overflow:
+            SimilarRecipe.objects.filter(pk__in=list(
+                SimilarRecipe.objects.filter(
+                    recipe_id=other_id
+                ).order_by('-score', 'pk').values_list(
+                    'pk', flat=True
+                )[limit:]
+            )).delete()
+
+
+def refresh_queued_similar_recipes(batch_size):
+    """Пересчитывает соседей пачки рецептов из очереди. Возвращает
+    число пересчитанных рецептов. Строки очереди заблокированы до конца
+    транзакции, несколько обработчиков не берут один рецепт."""
+
+    with transaction.atomic():
+        pks = list(SimilarRecipeRefresh.objects.select_for_update(
+            skip_locked=True
+        ).order_by('queued_at').values_list(
+            'recipe_id', flat=True
+        )[:batch_size])
+
+        for pk in pks:
+            refresh_similar_recipes(pk)
+
+        SimilarRecipeRefresh.objects.filter(recipe_id__in=pks).delete()
+
+    return len(pks)
+
+
+def rebuild_similar_recipes():
+    """Полностью перестраивает индекс похожих рецептов.
+    Возвращает число сохраненных пар."""
+
+    limit = settings.SIMILAR_RECIPES_LIMIT
+    batch_size = settings.SIMILAR_RECIPES_BATCH_SIZE
+    started = timezone.now()
+    recipe_ingredients = defaultdict(set)
+    ingredient_recipes = defaultdict(list)
+
+    for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id'
+    ).distinct().iterator(chunk_size=batch_size):
+        recipe_ingredients[recipe_id].add(ingredient_id)
+        ingredient_recipes[ingredient_id].append(recipe_id)
+
+    total = 0
+
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        bulk_list = []
+
+        for recipe_id, ingredients in recipe_ingredients.items():
+            shared = Counter()
+            for ingredient_id in ingredients:
+                shared.update(ingredient_recipes[ingredient_id])
+            del shared[recipe_id]
+
+            size = len(ingredients)
+            top = heapq.nlargest(limit, (
+                (other_id, jaccard(
+                    count, size, len(recipe_ingredients[other_id])
+                ))
+                for other_id, count in shared.items()
+            ), key=itemgetter(1))
+
+            bulk_list.extend(
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=other_id, score=score
+                )
+                for other_id, score in top
+            )
+
+            if len(bulk_list) >= batch_size:
+                SimilarRecipe.objects.bulk_create(bulk_list)
+                total += len(bulk_list)
+                bulk_list = []
+
+        SimilarRecipe.objects.bulk_create(bulk_list)
+        total += len(bulk_list)
+
+        # Изменения, поставленные в очередь до чтения ингредиентов,
+        # уже учтены.
+        SimilarRecipeRefresh.objects.filter(queued_at__lte=started).delete()
+
+    return total
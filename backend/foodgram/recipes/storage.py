@@ -0,0 +1,59 @@
+import hashlib
+import os
+from uuid import uuid4
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 содержимого.
+    Файлы раскладываются по вложенным каталогам по первым символам хэша:
+    recipes/ab/cd/abcd....png. Повторная загрузка того же содержимого
+    не записывает файл заново, а возвращает имя уже сохраненного."""
+
+    shard_depth = 2
+    shard_width = 2
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+
+        for chunk in content.chunks():
+            digest.update(chunk)
+
+        hexdigest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        shards = [
+            hexdigest[num * self.shard_width:(num + 1) * self.shard_width]
+            for num in range(self.shard_depth)
+        ]
+
+        return os.path.join(directory, *shards, hexdigest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.get_content_name(name, content)
+
+        if self.exists(name):
+            return name
+
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое.
+        return name
+
+    def _save(self, name, content):
+        # Файл пишется под временным именем и атомарно переименовывается,
+        # поэтому одновременная загрузка одного содержимого безопасна.
+        temp_name = super()._save(f'{name}.{uuid4().hex}.tmp', content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
@@ -1,9 +1,10 @@
 from django.contrib import admin
+from foodgram.soft_delete import SoftDeleteAdminMixin
 
 from .models import Subscription, User
 
 
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     model = User
     list_display = ['pk', 'username',
                     'first_name', 'last_name',
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.5 on 2026-10-19 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_subscription_delete_subscribtion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', '-sub_date'], name='subscription_user_date_idx'),
+        ),
+    ]
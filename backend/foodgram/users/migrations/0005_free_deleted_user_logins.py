@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+
+def free_deleted_logins(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    pk = Cast('pk', output_field=CharField())
+    # Менеджер по умолчанию скрывает удаленных пользователей.
+    User._base_manager.filter(deleted_at__isnull=False).update(
+        username=Concat(Value('deleted:'), pk, output_field=CharField()),
+        email=Concat(
+            Value('deleted:'), pk, Value('@deleted.invalid'),
+            output_field=CharField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(free_deleted_logins, migrations.RunPython.noop),
+    ]
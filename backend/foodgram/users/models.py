@@ -1,8 +1,49 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.db import models
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Cast, Concat
+from foodgram.soft_delete import (SoftDeleteManager, SoftDeleteModel,
+                                  SoftDeleteQuerySet)
 
 
-class User(AbstractUser):
+def tombstone(template):
+    """Значение поля удаленного пользователя с его id вместо {}:
+    двоеточие не проходит валидаторы имени и email, зарегистрировать
+    такое значение нельзя."""
+
+    prefix, suffix = template.split('{}')
+    return Concat(
+        Value(prefix), Cast('pk', output_field=CharField()), Value(suffix),
+        output_field=CharField()
+    )
+
+
+# Имя и email удаленного пользователя. Строка остается до purge_deleted,
+# а уникальность имени и email проверяется по всей таблице:
+# освобожденные значения можно снова указать при регистрации.
+DELETED_USERNAME = 'deleted:{}'
+DELETED_EMAIL = 'deleted:{}@deleted.invalid'
+
+
+class UserQuerySet(SoftDeleteQuerySet):
+
+    def mark_deleted(self, deleted_at):
+        # Токены удаленных пользователей перестают действовать:
+        # TokenAuthentication не пускает неактивных пользователей.
+        return self.update(
+            deleted_at=deleted_at, is_active=False,
+            username=tombstone(DELETED_USERNAME),
+            email=tombstone(DELETED_EMAIL)
+        )
+
+
+class UserManager(SoftDeleteManager.from_queryset(UserQuerySet),
+                  BaseUserManager):
+    pass
+
+
+class User(SoftDeleteModel, AbstractUser):
     email = models.EmailField(
         max_length=254,
         unique=True,
@@ -31,9 +72,17 @@ class User(AbstractUser):
 
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
 
+    objects = UserManager()
+
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            models.Index(
+                fields=['deleted_at'], name='user_deleted_at_idx',
+                condition=Q(deleted_at__isnull=False)
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['email', 'password'],
@@ -69,6 +118,12 @@ class Subscription(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         ordering = ['-sub_date']
+        indexes = [
+            models.Index(
+                fields=['user', '-sub_date'],
+                name='subscription_user_date_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'following'],